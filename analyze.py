@@ -0,0 +1,213 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+import chess.pgn
+
+import minimax_chess
+
+# Batch analysis
+# Streams positions from EPD or PGN files (one game or line at a time, the archive is never loaded whole)
+# and searches them on a process pool. Every worker process keeps its transposition table, eval cache
+# and move ordering tables between positions, and consecutive positions of a game go to the same worker.
+# Results are written to a JSONL file in input order, one chunk at a time, so memory stays bounded
+# and an interrupted run continues where it stopped with --resume.
+
+CHUNK_PER_WORKER = 32  # Positions per worker in every chunk sent to the pool
+POSITIONS_PER_TASK = 8  # Consecutive positions a worker searches in a row
+
+
+def read_epd(path):
+    # Yield (id, fen) for every line of an EPD file
+    with open(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            board, operations = chess.Board.from_epd(line)
+            yield str(operations.get("id", line_number)), board.fen()
+
+
+def read_pgn(path, every=1, min_ply=0):
+    # Yield (id, fen) for every position of every game, before each move from min_ply on
+    with open(path) as f:
+        for game_number in itertools.count(1):
+            game = chess.pgn.read_game(f)
+            if game is None:
+                break
+
+            board = game.board()
+            for ply, move in enumerate(game.mainline_moves()):
+                if ply >= min_ply and (ply - min_ply) % every == 0:
+                    yield f"{game_number}:{ply}", board.fen()
+                board.push(move)
+
+
+def read_positions(path, every=1, min_ply=0):
+    if path.lower().endswith(".pgn"):
+        return read_pgn(path, every, min_ply)
+    return read_epd(path)
+
+
+def init_worker(tt_size_mb, syzygy_path):
+    # Runs once in every worker process, the engine state then stays warm for all its positions
+    minimax_chess.tt_size_mb = tt_size_mb
+    minimax_chess.transposition_table.resize(tt_size_mb)
+    minimax_chess.set_syzygy_path(syzygy_path)
+    minimax_chess.new_game()
+
+
+def analyze_position(job):
+    index, position_id, fen, time_limit, node_limit, depth_limit = job
+    board = chess.Board(fen)
+
+    minimax_chess.transposition_table.new_search()
+    minimax_chess.age_move_ordering()
+    stats = minimax_chess.new_search_stats()
+
+    start_time = time.perf_counter()
+    best_move, best_eval, completed_depth = minimax_chess.iterative_deepening(
+        board, time_limit, node_limit, depth_limit
+    )
+    elapsed = time.perf_counter() - start_time
+
+    pv = []
+    if best_move is not None:
+        pv = minimax_chess.get_principal_variation(board, best_move, completed_depth)
+
+    return {
+        "index": index,
+        "id": position_id,
+        "fen": fen,
+        "best_move": best_move.uci() if best_move is not None else None,
+        "score": best_eval if not math.isinf(best_eval) else str(best_eval),
+        "depth": completed_depth,
+        "nodes": stats.nodes,
+        "time": elapsed,
+        "pv": [move.uci() for move in pv],
+    }
+
+
+def completed_positions(output_path):
+    # (number, total bytes) of the complete result lines in an earlier output file
+    count = 0
+    size = 0
+    if os.path.exists(output_path):
+        with open(output_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                count += 1
+                size += len(line)
+    return count, size
+
+
+def analyze(
+    input_path,
+    output_path,
+    workers=None,
+    time_limit=None,
+    node_limit=None,
+    depth_limit=None,
+    every=1,
+    min_ply=0,
+    resume=False,
+    tt_size_mb=None,
+    syzygy_path=None,
+):
+    # Analyse every position of input_path into output_path, returns the number of positions searched
+    workers = workers or os.cpu_count() or 1
+    if tt_size_mb is None:
+        tt_size_mb = minimax_chess.tt_size_mb
+    if time_limit is None and node_limit is None and depth_limit is None:
+        depth_limit = minimax_chess.max_depth
+
+    skip = 0
+    if resume and os.path.exists(output_path):
+        skip, size = completed_positions(output_path)
+        # Drop a partly written last line
+        with open(output_path, "rb+") as f:
+            f.truncate(size)
+
+    positions = itertools.islice(
+        enumerate(read_positions(input_path, every, min_ply)), skip, None
+    )
+    jobs = (
+        (index, position_id, fen, time_limit, node_limit, depth_limit)
+        for index, (position_id, fen) in positions
+    )
+
+    searched = 0
+    nodes = 0
+    start_time = time.perf_counter()
+    chunk_size = workers * CHUNK_PER_WORKER
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(tt_size_mb, syzygy_path),
+    ) as executor, open(output_path, "a" if resume else "w") as out:
+        while True:
+            chunk = list(itertools.islice(jobs, chunk_size))
+            if not chunk:
+                break
+
+            for result in executor.map(
+                analyze_position, chunk, chunksize=POSITIONS_PER_TASK
+            ):
+                out.write(json.dumps(result) + "\n")
+                nodes += result["nodes"]
+            out.flush()
+
+            searched += len(chunk)
+            elapsed = time.perf_counter() - start_time
+            print(
+                f"{skip + searched} positions, {searched / elapsed:.1f} positions/s, "
+                f"{int(nodes / elapsed)} nps"
+            )
+
+    return searched
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Analyse every position of an EPD or PGN file on a process pool, writing JSONL"
+    )
+    parser.add_argument("input", help=".epd or .pgn file")
+    parser.add_argument("-o", "--output", required=True, help="JSONL output file")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--time", type=float, default=None, help="seconds per position")
+    parser.add_argument("--nodes", type=int, default=None, help="nodes per position")
+    parser.add_argument("--depth", type=int, default=None, help="depth per position")
+    parser.add_argument(
+        "--every", type=int, default=1, help="PGN: analyse every n-th position"
+    )
+    parser.add_argument(
+        "--min-ply", type=int, default=0, help="PGN: skip the first plies of a game"
+    )
+    parser.add_argument("--hash", type=int, default=None, help="MB per worker")
+    parser.add_argument("--syzygy", default=None, help="Syzygy tablebase directory")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue after the positions already in the output file",
+    )
+    args = parser.parse_args()
+
+    analyze(
+        args.input,
+        args.output,
+        workers=args.workers,
+        time_limit=args.time,
+        node_limit=args.nodes,
+        depth_limit=args.depth,
+        every=args.every,
+        min_ply=args.min_ply,
+        resume=args.resume,
+        tt_size_mb=args.hash,
+        syzygy_path=args.syzygy,
+    )
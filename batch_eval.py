@@ -0,0 +1,308 @@
+import argparse
+import sys
+
+import chess
+import numpy as np
+
+import minimax_chess
+from minimax_chess import PIECE_SQUARE_VALUES, evaluate_board, mobility
+
+# Batch evaluation
+# evaluate_board works on one chess.Board at a time in Python, which is far too slow for millions of stored positions.
+# Here positions are turned into NumPy feature arrays once and every evaluation term is computed for all of them at the same time.
+# The weights are the ones evaluate_board uses (PIECE_SQUARE_TABLES, piece_values and the *_BONUS / *_PENALTY constants),
+# so the scores match evaluate_board exactly. The same arrays can be fed to weight tuning jobs.
+
+# Colors are indexed like python-chess: 0 is Black, 1 is White
+# Piece planes are indexed color * 6 + piece_type - 1 (Black pawn = 0, ..., White king = 11)
+NUM_PLANES = 12
+CHUNK_SIZE = 10_000  # Positions per evaluate_batch call of the command line tool
+
+
+def plane_index(color, piece_type):
+    return int(color) * 6 + piece_type - 1
+
+
+def build_plane_weights():
+    # Material plus piece square table value of every plane and square, from White's point of view
+    weights = np.zeros((NUM_PLANES, 64), dtype=np.int64)
+    for color in (chess.WHITE, chess.BLACK):
+        sign = 1 if color == chess.WHITE else -1
+        for piece_type in chess.PIECE_TYPES:
+            weights[plane_index(color, piece_type)] = sign * np.array(
+                PIECE_SQUARE_VALUES[color][piece_type]
+            )
+    return weights
+
+
+def build_king_shield_masks():
+    # [color][king_square][square] is True for the squares directly and diagonally ahead of the king
+    masks = np.zeros((2, 64, 64), dtype=bool)
+    for color in (chess.WHITE, chess.BLACK):
+        dr = 1 if color == chess.WHITE else -1
+        for king_square in chess.SQUARES:
+            f, r = chess.square_file(king_square), chess.square_rank(king_square)
+            for df in (-1, 0, 1):
+                nf, nr = f + df, r + dr
+                if 0 <= nf < 8 and 0 <= nr < 8:
+                    masks[int(color), king_square, chess.square(nf, nr)] = True
+    return masks
+
+
+PLANE_WEIGHTS = build_plane_weights()
+KING_SHIELD_MASKS = build_king_shield_masks()
+
+# Little-endian bit order turns a 64-bit bitboard into 64 squares a1, b1, ..., h8
+SQUARE_BITS = np.arange(64, dtype=np.uint64)
+
+
+def to_board(position):
+    if isinstance(position, chess.Board):
+        return position
+    return chess.Board(position)
+
+
+def extract_features(positions):
+    # Convert an iterable of FENs or chess.Board objects into a dict of NumPy feature arrays (N positions)
+    # Board-wide terms come from the piece planes. Terms that need attack generation
+    # (mobility, king attackers, check and terminal states) are read per board here.
+    bitboards = []
+    turn = []
+    in_check = []
+    checkmate = []
+    draw = []
+    mobility_counts = []
+    king_attackers = []
+
+    for position in positions:
+        board = to_board(position)
+        bitboards.append(
+            [
+                board.pieces_mask(piece_type, color)
+                for color in (chess.BLACK, chess.WHITE)
+                for piece_type in chess.PIECE_TYPES
+            ]
+        )
+        turn.append(board.turn)
+        in_check.append(board.is_check())
+        checkmate.append(board.is_checkmate())
+        draw.append(board.is_stalemate() or board.is_insufficient_material())
+        mobility_counts.append(
+            [mobility(board, chess.BLACK), mobility(board, chess.WHITE)]
+        )
+        king_attackers.append(
+            [
+                chess.popcount(board.attackers_mask(not color, board.king(color)))
+                for color in (chess.BLACK, chess.WHITE)
+            ]
+        )
+
+    bitboards = np.array(bitboards, dtype=np.uint64).reshape(-1, NUM_PLANES)
+
+    # One-hot piece square planes (N, 12, 64)
+    piece_squares = ((bitboards[:, :, None] >> SQUARE_BITS) & np.uint64(1)).astype(
+        np.uint8
+    )
+    by_color = piece_squares.reshape(-1, 2, 6, 64)
+    pawns = by_color[:, :, chess.PAWN - 1].reshape(-1, 2, 8, 8)
+    rooks = by_color[:, :, chess.ROOK - 1].reshape(-1, 2, 8, 8)
+    kings = by_color[:, :, chess.KING - 1]
+
+    return {
+        "piece_squares": piece_squares,
+        "piece_counts": piece_squares.sum(axis=2, dtype=np.int64),
+        # Pawns and rooks per file (N, 2, 8), summed over ranks
+        "pawn_files": pawns.sum(axis=2, dtype=np.int64),
+        "rook_files": rooks.sum(axis=2, dtype=np.int64),
+        "king_squares": kings.argmax(axis=2),
+        "turn": np.array(turn, dtype=bool),
+        "in_check": np.array(in_check, dtype=bool),
+        "checkmate": np.array(checkmate, dtype=bool),
+        "draw": np.array(draw, dtype=bool),
+        "mobility": np.array(mobility_counts, dtype=np.int64).reshape(-1, 2),
+        "king_attackers": np.array(king_attackers, dtype=np.int64).reshape(-1, 2),
+    }
+
+
+def pawn_structure_counts(pawn_files):
+    # Doubled and isolated pawn counts per color from the pawns per file (N, 2, 8)
+    doubled = np.maximum(pawn_files - 1, 0).sum(axis=2)
+
+    padded = np.pad(pawn_files, ((0, 0), (0, 0), (1, 1)))
+    no_neighbours = (padded[:, :, :-2] == 0) & (padded[:, :, 2:] == 0)
+    isolated = (pawn_files * no_neighbours).sum(axis=2)
+
+    return doubled, isolated
+
+
+def evaluation_terms(features, target_colors=None):
+    # Unweighted evaluation terms from target_color's point of view, each an (N,) array
+    # target_colors defaults to the side to move of every position
+    n = len(features["turn"])
+    if target_colors is None:
+        target = features["turn"].astype(np.int64)
+    else:
+        target = np.broadcast_to(np.asarray(target_colors, dtype=np.int64), (n,))
+    other = 1 - target
+    rows = np.arange(n)
+
+    def own(values):
+        return values[rows, target]
+
+    def opp(values):
+        return values[rows, other]
+
+    # einsum sums the weighted planes without an (N, 12, 64) int64 product array
+    material = np.einsum("npq,pq->n", features["piece_squares"], PLANE_WEIGHTS)
+
+    check = np.where(features["turn"] != target, 1, -1) * features["in_check"]
+    check_bonus = np.where(check > 0, 1, 0)
+    check_penalty = np.where(check < 0, 1, 0)
+
+    pawn_squares = features["piece_squares"][
+        :, [plane_index(c, chess.PAWN) for c in (0, 1)]
+    ]
+    king_shield = (
+        KING_SHIELD_MASKS[[[0, 1]], features["king_squares"]]
+        & pawn_squares.astype(bool)
+    ).sum(axis=2)
+
+    bishops = features["piece_counts"][
+        :, [plane_index(c, chess.BISHOP) for c in (0, 1)]
+    ]
+    bishop_pair = (bishops >= 2).astype(np.int64)
+
+    open_file_rooks = (features["rook_files"] * (features["pawn_files"] == 0)).sum(
+        axis=2
+    )
+
+    doubled, isolated = pawn_structure_counts(features["pawn_files"])
+
+    return {
+        "material": np.where(target == chess.WHITE, material, -material),
+        "check_bonus": check_bonus,
+        "check_penalty": check_penalty,
+        "mobility": own(features["mobility"]) - opp(features["mobility"]),
+        "king_shield": own(king_shield) - opp(king_shield),
+        "king_attack": own(features["king_attackers"])
+        - opp(features["king_attackers"]),
+        "bishop_pair": own(bishop_pair) - opp(bishop_pair),
+        "rook_open_file": own(open_file_rooks) - opp(open_file_rooks),
+        "doubled_pawns": own(doubled) - opp(doubled),
+        "isolated_pawns": own(isolated) - opp(isolated),
+    }
+
+
+def term_weights():
+    # Weight of every evaluation term, read from minimax_chess so tuned constants are picked up
+    return {
+        "material": 1,
+        "check_bonus": minimax_chess.CHECK_BONUS,
+        "check_penalty": -minimax_chess.CHECK_PENALTY,
+        "mobility": minimax_chess.MOBILITY_WEIGHT,
+        "king_shield": minimax_chess.KING_SHIELD_WEIGHT,
+        "king_attack": -minimax_chess.KING_ATTACK_PENALTY,
+        "bishop_pair": minimax_chess.BISHOP_PAIR_BONUS,
+        "rook_open_file": minimax_chess.ROOK_OPEN_FILE_BONUS,
+        "doubled_pawns": -minimax_chess.DOUBLED_PAWN_PENALTY,
+        "isolated_pawns": -minimax_chess.ISOLATED_PAWN_PENALTY,
+    }
+
+
+def score_features(features, target_colors=None):
+    # Score every position in one vectorized pass, matching evaluate_board(board, target_color)
+    n = len(features["turn"])
+    if target_colors is None:
+        target = features["turn"]
+    else:
+        target = np.broadcast_to(np.asarray(target_colors, dtype=bool), (n,))
+
+    terms = evaluation_terms(features, target)
+    weights = term_weights()
+    scores = sum(weights[name] * values for name, values in terms.items())
+    scores = scores.astype(np.float64)
+
+    # Terminal states
+    scores[features["draw"]] = 0
+    mate_sign = np.where(features["turn"] != target, 1.0, -1.0)
+    scores = np.where(features["checkmate"], mate_sign * np.inf, scores)
+
+    return scores
+
+
+def evaluate_batch(positions, target_colors=None):
+    return score_features(extract_features(positions), target_colors)
+
+
+def check_consistency(positions, target_colors=None):
+    # Compare the batch scores against evaluate_board and return the mismatches as (index, fen, expected, actual)
+    boards = [to_board(position) for position in positions]
+    scores = evaluate_batch(boards, target_colors)
+
+    mismatches = []
+    for i, board in enumerate(boards):
+        if target_colors is None:
+            target_color = board.turn
+        elif np.ndim(target_colors) == 0:
+            target_color = bool(target_colors)
+        else:
+            target_color = bool(target_colors[i])
+
+        expected = evaluate_board(board, target_color)
+        if expected != scores[i]:
+            mismatches.append((i, board.fen(), expected, scores[i]))
+    return mismatches
+
+
+def read_fens(path):
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def read_fen_chunks(path, chunk_size=CHUNK_SIZE):
+    # Lists of up to chunk_size FENs, so a large file is never held in memory at once
+    chunk = []
+    for fen in read_fens(path):
+        chunk.append(fen)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Score a file of FENs (one per line) for the side to move"
+    )
+    parser.add_argument("fen_file")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="compare every score against evaluate_board",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_SIZE,
+        help="positions evaluated per batch",
+    )
+    args = parser.parse_args()
+
+    if args.check:
+        total = 0
+        mismatch_count = 0
+        for fens in read_fen_chunks(args.fen_file, args.chunk_size):
+            for i, fen, expected, actual in check_consistency(fens):
+                print(f"{total + i}: {fen} evaluate_board={expected} batch={actual}")
+                mismatch_count += 1
+            total += len(fens)
+        print(f"{total - mismatch_count}/{total} positions match")
+        sys.exit(1 if mismatch_count else 0)
+
+    for fens in read_fen_chunks(args.fen_file, args.chunk_size):
+        for fen, score in zip(fens, evaluate_batch(fens)):
+            print(f"{fen}\t{score}")
@@ -0,0 +1,263 @@
+import argparse
+import cProfile
+import json
+import pstats
+import sys
+import time
+
+import chess
+
+import minimax_chess
+
+# Benchmark
+# Searches a fixed set of positions to a fixed depth from a fresh engine state (new_game before every position),
+# so the total node count is deterministic. It is the bench signature: a change that should not alter the search
+# (a speedup) must keep it, a change to evaluation, ordering or pruning will change it.
+# NPS and the time per position show whether a change made the engine faster.
+# The opening book and tablebases are not used so only the search is measured.
+
+BENCH_DEPTH = 4
+
+BENCH_POSITIONS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP3PPP/R2QKB1R w KQ - 0 8",
+    "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+    "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+    "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1",
+]
+
+# Perft: (fen, depth, expected leaf nodes) from the standard perft test positions
+PERFT_POSITIONS = [
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", 4, 197281),
+    (
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        3,
+        97862,
+    ),
+    ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 4, 43238),
+    ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", 3, 9467),
+    ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 3, 62379),
+]
+
+
+def run_bench(depth=BENCH_DEPTH, positions=BENCH_POSITIONS):
+    # Search every position to depth and return a result dict with the per-position numbers and the signature
+    results = []
+    for fen in positions:
+        minimax_chess.new_game()
+        stats = minimax_chess.new_search_stats()
+        board = chess.Board(fen)
+
+        start_time = time.perf_counter()
+        best_move, best_eval, _ = minimax_chess.iterative_deepening(
+            board, depth_limit=depth
+        )
+        elapsed = time.perf_counter() - start_time
+
+        nodes = stats.nodes
+        results.append(
+            {
+                "fen": fen,
+                "best_move": best_move.uci() if best_move is not None else None,
+                "score": (
+                    best_eval if abs(best_eval) != float("inf") else str(best_eval)
+                ),
+                "nodes": nodes,
+                "time": elapsed,
+                "nps": int(nodes / elapsed) if elapsed > 0 else 0,
+                "stats": stats.as_dict(),
+            }
+        )
+
+    total_nodes = sum(result["nodes"] for result in results)
+    total_time = sum(result["time"] for result in results)
+    return {
+        "depth": depth,
+        "positions": results,
+        "signature": total_nodes,
+        "nodes": total_nodes,
+        "time": total_time,
+        "nps": int(total_nodes / total_time) if total_time > 0 else 0,
+    }
+
+
+def perft(board, depth):
+    # Number of leaf nodes of the legal move tree to depth
+    if depth == 0:
+        return 1
+    if depth == 1:
+        return board.legal_moves.count()
+
+    nodes = 0
+    for move in board.legal_moves:
+        board.push(move)
+        nodes += perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+
+def run_perft(positions=PERFT_POSITIONS):
+    # Time move generation on the perft positions and check every count
+    results = []
+    for fen, depth, expected in positions:
+        board = chess.Board(fen)
+        start_time = time.perf_counter()
+        nodes = perft(board, depth)
+        elapsed = time.perf_counter() - start_time
+        results.append(
+            {
+                "fen": fen,
+                "depth": depth,
+                "nodes": nodes,
+                "expected": expected,
+                "ok": nodes == expected,
+                "time": elapsed,
+                "nps": int(nodes / elapsed) if elapsed > 0 else 0,
+            }
+        )
+
+    total_nodes = sum(result["nodes"] for result in results)
+    total_time = sum(result["time"] for result in results)
+    return {
+        "positions": results,
+        "ok": all(result["ok"] for result in results),
+        "nodes": total_nodes,
+        "time": total_time,
+        "nps": int(total_nodes / total_time) if total_time > 0 else 0,
+    }
+
+
+def compare(report, baseline):
+    # Differences against an earlier JSON report, returns a list of lines (empty if nothing to report)
+    lines = []
+    if "bench" in report and "bench" in baseline:
+        old, new = baseline["bench"], report["bench"]
+        if old["depth"] == new["depth"] and old["signature"] != new["signature"]:
+            lines.append(f"signature changed: {old['signature']} -> {new['signature']}")
+        if old["nps"]:
+            lines.append(
+                f"bench nps: {old['nps']} -> {new['nps']} ({new['nps'] / old['nps']:.2f}x)"
+            )
+    if "perft" in report and "perft" in baseline and baseline["perft"]["nps"]:
+        old, new = baseline["perft"], report["perft"]
+        lines.append(
+            f"perft nps: {old['nps']} -> {new['nps']} ({new['nps'] / old['nps']:.2f}x)"
+        )
+    return lines
+
+
+def print_bench(bench):
+    print(f"{'nodes':>9} {'time':>8} {'nps':>8}  move   fen")
+    for result in bench["positions"]:
+        print(
+            f"{result['nodes']:>9} {result['time']:>7.2f}s {result['nps']:>8}  "
+            f"{result['best_move'] or '-':<6} {result['fen']}"
+        )
+    print(f"Depth: {bench['depth']}")
+    print(f"Total time: {bench['time']:.2f}s")
+    print(f"Nodes searched: {bench['nodes']}")
+    print(f"Nodes/second: {bench['nps']}")
+    print(f"Signature: {bench['signature']}")
+
+    if bench["positions"] and bench["positions"][0]["stats"]["eval_time"]:
+        eval_time = sum(result["stats"]["eval_time"] for result in bench["positions"])
+        order_time = sum(result["stats"]["order_time"] for result in bench["positions"])
+        movegen_time = sum(
+            result["stats"]["movegen_time"] for result in bench["positions"]
+        )
+        print(
+            f"Time in evaluate_board: {eval_time:.2f}s, order_moves: {order_time:.2f}s, "
+            f"move generation: {movegen_time:.2f}s"
+        )
+
+
+def print_perft(perft_report):
+    print(f"{'nodes':>9} {'time':>8} {'nps':>9}  depth  fen")
+    for result in perft_report["positions"]:
+        status = "" if result["ok"] else f"  MISMATCH (expected {result['expected']})"
+        print(
+            f"{result['nodes']:>9} {result['time']:>7.2f}s {result['nps']:>9}  "
+            f"{result['depth']:>5}  {result['fen']}{status}"
+        )
+    print(f"Perft nodes/second: {perft_report['nps']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fixed-depth search benchmark with a deterministic node signature, and perft"
+    )
+    parser.add_argument("--depth", type=int, default=BENCH_DEPTH)
+    parser.add_argument("--perft", action="store_true", help="also run perft")
+    parser.add_argument(
+        "--perft-only", action="store_true", help="run perft without the search bench"
+    )
+    parser.add_argument("--json", metavar="PATH", help="write the report as JSON")
+    parser.add_argument(
+        "--compare", metavar="PATH", help="compare against an earlier JSON report"
+    )
+    parser.add_argument(
+        "--no-null-move", action="store_true", help="search without null-move pruning"
+    )
+    parser.add_argument(
+        "--no-lmr", action="store_true", help="search without late move reductions"
+    )
+    parser.add_argument(
+        "--no-aspiration",
+        action="store_true",
+        help="search the root with the full window",
+    )
+    parser.add_argument(
+        "--timing",
+        action="store_true",
+        help="time evaluate_board, order_moves and move generation (slows the search down)",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="run the bench under cProfile"
+    )
+    parser.add_argument(
+        "--signature",
+        type=int,
+        help="exit with an error if the bench signature is different",
+    )
+    args = parser.parse_args()
+
+    minimax_chess.null_move_pruning = not args.no_null_move
+    minimax_chess.late_move_reductions = not args.no_lmr
+    minimax_chess.aspiration_windows = not args.no_aspiration
+
+    report = {}
+    if not args.perft_only:
+        minimax_chess.set_timing(args.timing)
+        profiler = cProfile.Profile() if args.profile else None
+        if profiler is not None:
+            profiler.enable()
+        report["bench"] = run_bench(args.depth)
+        if profiler is not None:
+            profiler.disable()
+        minimax_chess.set_timing(False)
+
+        print_bench(report["bench"])
+        if profiler is not None:
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+    if args.perft or args.perft_only:
+        report["perft"] = run_perft()
+        print_perft(report["perft"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            for line in compare(report, json.load(f)):
+                print(line)
+
+    failed = "perft" in report and not report["perft"]["ok"]
+    if args.signature is not None and "bench" in report:
+        failed = failed or report["bench"]["signature"] != args.signature
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,445 @@
+# Cooperative search
+# Without threads (the pygbag build in a browser tab) a blocking search freezes the page.
+# This is the search of minimax_chess as coroutines: awaited on an asyncio event loop, they yield with
+# asyncio.sleep(0) every yield_interval nodes, so the game loop keeps drawing and handling input.
+# Setting minimax_chess.stop_event ends the search at the next yield.
+# The search state (budget, statistics, transposition table, settings) is the state of minimax_chess,
+# so only one search may run at a time, either this one or the synchronous one.
+# Keep quiescence, minimax_alphabeta, search_root and iterative_deepening in step with minimax_chess.
+import asyncio
+import chess
+import chess.polyglot
+import time
+import math
+import minimax_chess
+from minimax_chess import (
+    EXACT,
+    LOWERBOUND,
+    UPPERBOUND,
+    SearchTimeout,
+    cached_evaluate,
+    capture_score,
+    in_tablebase_range,
+    material_score,
+    move_deltas,
+    open_tablebase,
+    probe_wdl,
+    tablebase_score,
+    update_quiet_cutoff,
+    zobrist_state,
+)
+
+YIELD_INTERVAL = 256  # Nodes between yields to the event loop
+
+search_yield_interval = None  # Set while iterative_deepening runs
+
+
+async def check_search_limits():
+    minimax_chess.check_search_limits()
+    if minimax_chess.search_stats.nodes % search_yield_interval == 0:
+        await asyncio.sleep(0)
+        if minimax_chess.stop_event.is_set():
+            raise SearchTimeout()
+
+
+async def quiescence(board, alpha, beta, material, qdepth=0, key=None):
+    minimax_chess.search_stats.nodes += 1
+    minimax_chess.search_stats.qnodes += 1
+    await check_search_limits()
+
+    if key is None:
+        key = chess.polyglot.zobrist_hash(board)
+
+    in_check = board.is_check()
+    if qdepth >= minimax_chess.QUIESCENCE_MAX_DEPTH or (
+        not in_check and board.is_insufficient_material()
+    ):
+        return cached_evaluate(board, board.turn, material, key)
+
+    if in_check:
+        moves = minimax_chess.generate_moves(board)
+        if not moves:
+            return cached_evaluate(board, board.turn, material, key)
+        best = -math.inf
+    else:
+        best = cached_evaluate(board, board.turn, material, key)
+        if best >= beta:
+            return best
+        alpha = max(alpha, best)
+
+        moves = minimax_chess.generate_captures(board)
+
+    moves.sort(key=lambda move: capture_score(board, move), reverse=True)
+    state_key = zobrist_state(board)
+
+    for move in moves:
+        material_change, key_change = move_deltas(board, move)
+        board.push(move)
+        score = -await quiescence(
+            board,
+            -beta,
+            -alpha,
+            material + material_change,
+            qdepth + 1,
+            key ^ key_change ^ state_key ^ zobrist_state(board),
+        )
+        board.pop()
+
+        if score > best:
+            best = score
+        if score > alpha:
+            alpha = score
+        if alpha >= beta:
+            break
+
+    return best
+
+
+async def minimax_alphabeta(
+    board,
+    alpha=-math.inf,
+    beta=math.inf,
+    depth=0,
+    search_depth=None,
+    material=None,
+    key=None,
+):
+    minimax_chess.search_stats.nodes += 1
+    await check_search_limits()
+
+    if search_depth is None:
+        search_depth = minimax_chess.max_depth
+    if material is None:
+        material = material_score(board)
+    if key is None:
+        key = chess.polyglot.zobrist_hash(board)
+
+    depth_left = search_depth - depth
+
+    alpha_original = alpha
+
+    tt_move = None
+    minimax_chess.search_stats.tt_probes += 1
+    entry = minimax_chess.transposition_table.probe(key)
+    if entry is not None:
+        minimax_chess.search_stats.tt_hits += 1
+        saved_depth, saved_val, saved_flag, tt_move = entry
+        if saved_depth >= depth_left:
+            if (
+                saved_flag == EXACT
+                or (saved_flag == LOWERBOUND and saved_val >= beta)
+                or (saved_flag == UPPERBOUND and saved_val <= alpha)
+            ):
+                minimax_chess.search_stats.tt_cutoffs += 1
+                return saved_val
+
+    if (
+        minimax_chess.syzygy_path is not None
+        and open_tablebase()
+        and in_tablebase_range(board)
+    ):
+        wdl = probe_wdl(board, key)
+        if wdl is not None:
+            val = tablebase_score(wdl)
+            minimax_chess.transposition_table.store(
+                key, minimax_chess.MAX_ITERATIVE_DEPTH, val, EXACT
+            )
+            return val
+
+    if board.is_game_over():
+        val = cached_evaluate(board, board.turn, material, key)
+        minimax_chess.transposition_table.store(key, depth_left, val, EXACT)
+        return val
+
+    if depth >= search_depth:
+        val = await quiescence(board, alpha, beta, material, key=key)
+        if val <= alpha_original:
+            flag = UPPERBOUND
+        elif val >= beta:
+            flag = LOWERBOUND
+        else:
+            flag = EXACT
+        minimax_chess.transposition_table.store(key, depth_left, val, flag)
+        return val
+
+    state_key = zobrist_state(board)
+    in_check = board.is_check()
+
+    if (
+        minimax_chess.null_move_pruning
+        and depth > 0
+        and depth_left >= minimax_chess.NULL_MOVE_MIN_DEPTH
+        and beta - alpha == 1
+        and beta != math.inf
+        and not in_check
+        and board.occupied_co[board.turn] & ~(board.pawns | board.kings)
+        and board.move_stack
+        and board.move_stack[-1]
+        and cached_evaluate(board, board.turn, material, key) >= beta
+    ):
+        board.push(chess.Move.null())
+        null_key = key ^ state_key ^ zobrist_state(board)
+        score = -await minimax_alphabeta(
+            board,
+            -beta,
+            -beta + 1,
+            depth + 1,
+            search_depth - minimax_chess.NULL_MOVE_REDUCTION,
+            material,
+            null_key,
+        )
+        board.pop()
+        if score >= beta:
+            minimax_chess.search_stats.null_move_cutoffs += 1
+            return beta
+
+    best = -math.inf
+    best_move = None
+
+    for move_index, move in enumerate(minimax_chess.order_moves(board, tt_move, depth)):
+        quiet = not move.promotion and not board.is_capture(move)
+        material_change, key_change = move_deltas(board, move)
+        board.push(move)
+        child_material = material + material_change
+        child_key = key ^ key_change ^ state_key ^ zobrist_state(board)
+
+        reduction = 0
+        if (
+            minimax_chess.late_move_reductions
+            and move_index >= minimax_chess.LMR_MIN_MOVE_INDEX
+            and alpha != -math.inf
+            and depth_left >= minimax_chess.LMR_MIN_DEPTH
+            and quiet
+            and not in_check
+            and not board.is_check()
+        ):
+            reduction = minimax_chess.LMR_REDUCTION
+            minimax_chess.search_stats.reductions += 1
+
+        if move_index == 0 or alpha == -math.inf:
+            score = -await minimax_alphabeta(
+                board, -beta, -alpha, depth + 1, search_depth, child_material, child_key
+            )
+        else:
+            score = -await minimax_alphabeta(
+                board,
+                -alpha - 1,
+                -alpha,
+                depth + 1,
+                search_depth - reduction,
+                child_material,
+                child_key,
+            )
+            if reduction and score > alpha:
+                minimax_chess.search_stats.reduction_researches += 1
+                score = -await minimax_alphabeta(
+                    board,
+                    -alpha - 1,
+                    -alpha,
+                    depth + 1,
+                    search_depth,
+                    child_material,
+                    child_key,
+                )
+            if alpha < score < beta:
+                score = -await minimax_alphabeta(
+                    board,
+                    -beta,
+                    -alpha,
+                    depth + 1,
+                    search_depth,
+                    child_material,
+                    child_key,
+                )
+        board.pop()
+
+        if score > best:
+            best = score
+            best_move = move
+
+        if score > alpha:
+            alpha = score
+        if alpha >= beta:
+            minimax_chess.search_stats.beta_cutoffs += 1
+            if move_index == 0:
+                minimax_chess.search_stats.first_move_cutoffs += 1
+            if not board.is_capture(move):
+                update_quiet_cutoff(board, move, depth, depth_left)
+            break
+
+    if best <= alpha_original:
+        flag = UPPERBOUND
+    elif best >= beta:
+        flag = LOWERBOUND
+    else:
+        flag = EXACT
+
+    minimax_chess.transposition_table.store(key, depth_left, best, flag, best_move)
+    return best
+
+
+async def search_root(board, root_moves, search_depth, alpha=-math.inf, beta=math.inf):
+    best_move = root_moves[0]
+    best_eval = -math.inf
+    material = material_score(board)
+    key = chess.polyglot.zobrist_hash(board)
+    state_key = zobrist_state(board)
+
+    for move_index, move in enumerate(root_moves):
+        material_change, key_change = move_deltas(board, move)
+        board.push(move)
+        child_material = material + material_change
+        child_key = key ^ key_change ^ state_key ^ zobrist_state(board)
+
+        if move_index == 0 or alpha == -math.inf:
+            current_eval = -await minimax_alphabeta(
+                board, -beta, -alpha, 1, search_depth, child_material, child_key
+            )
+        else:
+            current_eval = -await minimax_alphabeta(
+                board,
+                -alpha - 1,
+                -alpha,
+                1,
+                search_depth,
+                child_material,
+                child_key,
+            )
+            if alpha < current_eval < beta:
+                current_eval = -await minimax_alphabeta(
+                    board,
+                    -beta,
+                    -alpha,
+                    1,
+                    search_depth,
+                    child_material,
+                    child_key,
+                )
+        board.pop()
+
+        if current_eval > best_eval:
+            best_eval = current_eval
+            best_move = move
+        if current_eval > alpha:
+            alpha = current_eval
+        if alpha >= beta:
+            break
+
+    return best_move, best_eval
+
+
+async def iterative_deepening(
+    board,
+    time_limit=None,
+    node_limit=None,
+    depth_limit=None,
+    start_depth=1,
+    root_rotation=0,
+    info_callback=None,
+    yield_interval=YIELD_INTERVAL,
+):
+    global search_yield_interval
+
+    search_yield_interval = yield_interval
+    start_time = time.time()
+    minimax_chess.search_deadline = (
+        start_time + time_limit if time_limit is not None else None
+    )
+    minimax_chess.search_node_limit = node_limit
+    if depth_limit is not None:
+        depth_cap = depth_limit
+    elif time_limit is not None or node_limit is not None:
+        depth_cap = minimax_chess.MAX_ITERATIVE_DEPTH
+    else:
+        depth_cap = minimax_chess.max_depth
+
+    root_key = chess.polyglot.zobrist_hash(board)
+    entry = minimax_chess.transposition_table.probe(root_key)
+    root_moves = minimax_chess.order_moves(
+        board, entry[3] if entry is not None else None, 0
+    )
+    if not root_moves:
+        return None, minimax_chess.evaluate_board(board, board.turn), 0
+
+    if root_rotation and len(root_moves) > 2:
+        shift = root_rotation % (len(root_moves) - 1)
+        root_moves[1:] = root_moves[1 + shift :] + root_moves[1 : 1 + shift]
+
+    best_move = root_moves[0]
+    best_eval = -math.inf
+    completed_depth = 0
+    stack_size = len(board.move_stack)
+
+    try:
+        for search_depth in range(min(start_depth, depth_cap), depth_cap + 1):
+            alpha, beta = -math.inf, math.inf
+            delta = minimax_chess.ASPIRATION_WINDOW
+            if (
+                minimax_chess.aspiration_windows
+                and completed_depth
+                and search_depth >= minimax_chess.ASPIRATION_MIN_DEPTH
+                and abs(best_eval) < minimax_chess.TB_WIN_SCORE
+            ):
+                alpha, beta = best_eval - delta, best_eval + delta
+
+            while True:
+                move, value = await search_root(
+                    board, root_moves, search_depth, alpha, beta
+                )
+                if value <= alpha and alpha != -math.inf:
+                    flag = UPPERBOUND
+                elif value >= beta and beta != math.inf:
+                    flag = LOWERBOUND
+                    root_moves.remove(move)
+                    root_moves.insert(0, move)
+                else:
+                    break
+
+                minimax_chess.search_stats.aspiration_researches += 1
+                minimax_chess.transposition_table.store(
+                    root_key,
+                    search_depth,
+                    value,
+                    flag,
+                    move if flag == LOWERBOUND else None,
+                )
+                delta *= 2
+                if flag == UPPERBOUND:
+                    alpha = (
+                        value - delta
+                        if delta < minimax_chess.ASPIRATION_MAX_WINDOW
+                        else -math.inf
+                    )
+                else:
+                    beta = (
+                        value + delta
+                        if delta < minimax_chess.ASPIRATION_MAX_WINDOW
+                        else math.inf
+                    )
+
+            best_move, best_eval = move, value
+            completed_depth = search_depth
+            minimax_chess.search_stats.iteration_nodes.append(
+                (search_depth, minimax_chess.search_stats.nodes)
+            )
+            minimax_chess.transposition_table.store(
+                root_key, search_depth, best_eval, EXACT, best_move
+            )
+
+            if info_callback is not None:
+                info_callback(search_depth, best_move, best_eval)
+
+            root_moves.remove(best_move)
+            root_moves.insert(0, best_move)
+
+            if best_eval in (math.inf, -math.inf):
+                break
+    except SearchTimeout:
+        while len(board.move_stack) > stack_size:
+            board.pop()
+    finally:
+        minimax_chess.search_deadline = None
+        minimax_chess.search_node_limit = None
+        search_yield_interval = None
+
+    return best_move, best_eval, completed_depth
@@ -1,9 +1,13 @@
+import asyncio
 import pygame
 import chess
+import queue
+import threading
 import time
 import sys
 import os
-from minimax_chess import get_minimax_move
+import minimax_chess
+import cooperative_search
 
 # Build with: pyinstaller --onedir --windowed --add-data "assets:assets" --icon=assets/icon.icns pygame_minimax_chess.py
 
@@ -29,7 +33,20 @@ WINDOW_WIDTH = BOARD_PIXELS
 WINDOW_HEIGHT = TOP_MARGIN + BOARD_PIXELS + BOTTOM_MARGIN
 DOT_RADIUS = 16
 ENGINE_FONT_SIZE = 24
-FPS = 120
+FPS = 120  # Frame rate while a piece is dragged
+ENGINE_FPS = 10  # Frame rate while the engine thinks, for the banner
+IDLE_TIMEOUT_MS = 1000  # Longest wait for input when nothing on screen changes
+ENGINE_TIME_LIMIT = 3.0  # Seconds the engine may think per move
+PONDER = True  # Think on the user's time, turn off where idle CPU matters (kiosks, laptops on battery)
+PONDER_TIME_LIMIT = (
+    10.0  # Seconds a ponder search may run before it waits for the user's move
+)
+
+# The pygbag build runs in a browser tab, without threads and with a much slower Python
+BROWSER = sys.platform == "emscripten"
+ENGINE_NODE_LIMIT = (
+    20_000 if BROWSER else None
+)  # Nodes the engine may search per move, None for no limit
 
 
 def load_images():
@@ -43,6 +60,14 @@ def load_images():
     return imgs
 
 
+def load_capture_images(images):
+    # Piece images scaled down once for the captured pieces rows
+    return {
+        key: pygame.transform.smoothscale(img, (CAPTURE_HEIGHT, CAPTURE_HEIGHT))
+        for key, img in images.items()
+    }
+
+
 def board_to_screen(sq, orient_white):
     file = chess.square_file(sq)
     rank = chess.square_rank(sq)
@@ -97,8 +122,7 @@ def draw_board(screen):
             pygame.draw.rect(screen, light if (r + f) % 2 == 0 else dark, rect)
 
 
-def draw_labels(screen, orient_white):
-    font = pygame.font.SysFont(None, LABEL_FONT_SIZE)
+def draw_labels(screen, orient_white, font):
     files = "abcdefgh"
 
     # Top Labels
@@ -138,8 +162,8 @@ def draw_labels(screen, orient_white):
         screen.blit(surf, (WINDOW_WIDTH - w, y))
 
 
-def draw_pieces(screen, board, images, dragging_src, orient_white):
-    for sq, p in board.piece_map().items():
+def draw_pieces(screen, pieces, images, dragging_src, orient_white):
+    for sq, p in pieces.items():
         if dragging_src is not None and sq == dragging_src:
             continue
 
@@ -148,51 +172,206 @@ def draw_pieces(screen, board, images, dragging_src, orient_white):
         screen.blit(images[key], (x, y))
 
 
-def draw_move_hints(screen, board, src_sq, orient_white):
-    for mv in board.legal_moves:
-        if mv.from_square == src_sq:
-            x, y = board_to_screen(mv.to_square, orient_white)
-            cx = x + SQUARE_SIZE // 2
-            cy = y + SQUARE_SIZE // 2
-            pygame.draw.circle(
-                screen, pygame.Color(108, 108, 68, 180), (cx, cy), DOT_RADIUS
-            )
+def draw_move_hints(screen, targets, orient_white):
+    for to_square in targets:
+        x, y = board_to_screen(to_square, orient_white)
+        cx = x + SQUARE_SIZE // 2
+        cy = y + SQUARE_SIZE // 2
+        pygame.draw.circle(
+            screen, pygame.Color(108, 108, 68, 180), (cx, cy), DOT_RADIUS
+        )
 
 
-def draw_captured(screen, images, white_captures, black_captures):
+def draw_captured(screen, capture_images, white_captures, black_captures):
     for i, p in enumerate(white_captures):
         prefix = "w" if p.color else "b"
-        img = pygame.transform.smoothscale(
-            images[prefix + p.symbol().upper()], (CAPTURE_HEIGHT, CAPTURE_HEIGHT)
-        )
-
         x = i * CAPTURE_HEIGHT
         y = LABEL_MARGIN
-        screen.blit(img, (x, y))
+        screen.blit(capture_images[prefix + p.symbol().upper()], (x, y))
 
     base_y = TOP_MARGIN + BOARD_PIXELS
     for i, p in enumerate(black_captures):
         prefix = "w" if p.color else "b"
-        img = pygame.transform.smoothscale(
-            images[prefix + p.symbol().upper()], (CAPTURE_HEIGHT, CAPTURE_HEIGHT)
+        x = i * CAPTURE_HEIGHT
+        screen.blit(capture_images[prefix + p.symbol().upper()], (x, base_y))
+
+
+def draw_engine_banner(screen, bar, text_surf):
+    screen.blit(bar, (0, WINDOW_HEIGHT - (ENGINE_FONT_SIZE + 10)))
+    screen.blit(text_surf, (10, WINDOW_HEIGHT - (ENGINE_FONT_SIZE + 6)))
+
+
+def square_rect(sq, orient_white):
+    return pygame.Rect(board_to_screen(sq, orient_white), (SQUARE_SIZE, SQUARE_SIZE))
+
+
+class Renderer:
+    # Draws the game screen and only updates the parts that changed since the last frame.
+    # The board squares and labels never change during a game, so they are drawn once to a background surface.
+    # Every frame is compared with the previous one (pieces, dragged piece, move hints, captures, banner text).
+    # The rectangles that differ are repainted from the background up, clipped to each rectangle,
+    # and only those are sent to the display. An unchanged frame costs nothing.
+
+    def __init__(self, screen, images, orient_white):
+        self.screen = screen
+        self.images = images
+        self.orient_white = orient_white
+        self.capture_images = load_capture_images(images)
+
+        self.background = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.background.fill((50, 50, 50))
+        draw_board(self.background)
+        draw_labels(
+            self.background, orient_white, pygame.font.SysFont(None, LABEL_FONT_SIZE)
         )
 
-        x = i * CAPTURE_HEIGHT
-        screen.blit(img, (x, base_y))
+        self.banner_font = pygame.font.SysFont(None, ENGINE_FONT_SIZE)
+        self.banner_bar = pygame.Surface(
+            (WINDOW_WIDTH, ENGINE_FONT_SIZE + 10), pygame.SRCALPHA
+        )
+        self.banner_bar.fill((0, 0, 0, 150))
+        self.banner_rect = pygame.Rect(
+            0,
+            WINDOW_HEIGHT - (ENGINE_FONT_SIZE + 10),
+            WINDOW_WIDTH,
+            ENGINE_FONT_SIZE + 10,
+        )
+        self.banner_text = None
+        self.banner_surf = None
+
+        self.capture_rects = [
+            pygame.Rect(0, LABEL_MARGIN, WINDOW_WIDTH, CAPTURE_HEIGHT),
+            pygame.Rect(0, TOP_MARGIN + BOARD_PIXELS, WINDOW_WIDTH, CAPTURE_HEIGHT),
+        ]
+
+        # Target squares of every piece's legal moves, for the position with moves_ply half-moves played
+        self.moves_ply = None
+        self.moves_by_source = {}
+
+        self.scene = None  # What is on screen now, None to redraw everything
+
+    def move_targets(self, board, src_sq):
+        if self.moves_ply != len(board.move_stack):
+            self.moves_ply = len(board.move_stack)
+            self.moves_by_source = {}
+            for mv in board.legal_moves:
+                self.moves_by_source.setdefault(mv.from_square, set()).add(mv.to_square)
+        return frozenset(self.moves_by_source.get(src_sq, ()))
+
+    def draw(
+        self,
+        board,
+        top_captures,
+        bottom_captures,
+        drag_src_sq,
+        drag_img,
+        drag_pos,
+        banner_text,
+    ):
+        targets = frozenset()
+        if drag_src_sq is not None:
+            targets = self.move_targets(board, drag_src_sq)
+        drag_rect = None
+        if drag_img is not None:
+            drag_rect = pygame.Rect(
+                drag_pos[0] - SQUARE_SIZE // 2,
+                drag_pos[1] - SQUARE_SIZE // 2,
+                SQUARE_SIZE,
+                SQUARE_SIZE,
+            )
+        if banner_text != self.banner_text:
+            self.banner_text = banner_text
+            self.banner_surf = None
+            if banner_text is not None:
+                self.banner_surf = self.banner_font.render(
+                    banner_text, True, pygame.Color("white")
+                )
+
+        scene = {
+            "pieces": board.piece_map(),
+            "drag_src_sq": drag_src_sq,
+            "drag_rect": drag_rect,
+            "targets": targets,
+            "captures": (tuple(top_captures), tuple(bottom_captures)),
+            "banner_text": banner_text,
+        }
+
+        if self.scene is None:
+            dirty = [self.screen.get_rect()]
+        else:
+            dirty = self.dirty_rects(self.scene, scene)
+        self.scene = scene
+        if not dirty:
+            return
+
+        for rect in dirty:
+            self.screen.set_clip(rect)
+            self.paint(scene, drag_img)
+        self.screen.set_clip(None)
+        pygame.display.update(dirty)
+
+    def dirty_rects(self, old, new):
+        dirty = []
+        for sq in old["pieces"].keys() | new["pieces"].keys():
+            if old["pieces"].get(sq) != new["pieces"].get(sq):
+                dirty.append(square_rect(sq, self.orient_white))
+        if old["drag_src_sq"] != new["drag_src_sq"]:
+            for sq in (old["drag_src_sq"], new["drag_src_sq"]):
+                if sq is not None:
+                    dirty.append(square_rect(sq, self.orient_white))
+        for sq in old["targets"] ^ new["targets"]:
+            dirty.append(square_rect(sq, self.orient_white))
+        if old["drag_rect"] != new["drag_rect"]:
+            dirty.extend(rect for rect in (old["drag_rect"], new["drag_rect"]) if rect)
+        if old["captures"] != new["captures"]:
+            dirty.extend(self.capture_rects)
+        if old["banner_text"] != new["banner_text"]:
+            dirty.append(self.banner_rect)
+        return dirty
+
+    def paint(self, scene, drag_img):
+        # Paint the whole frame, the clip rectangle limits it to the dirty part
+        screen = self.screen
+        screen.blit(self.background, (0, 0))
+        draw_pieces(
+            screen,
+            scene["pieces"],
+            self.images,
+            scene["drag_src_sq"],
+            self.orient_white,
+        )
 
+        draw_captured(screen, self.capture_images, *scene["captures"])
+        draw_move_hints(screen, scene["targets"], self.orient_white)
+        if scene["drag_rect"] is not None:
+            screen.blit(drag_img, scene["drag_rect"])
+        if self.banner_surf is not None:
+            draw_engine_banner(screen, self.banner_bar, self.banner_surf)
 
-def draw_engine_banner(screen, text):
-    font = pygame.font.SysFont(None, ENGINE_FONT_SIZE)
-    surf = font.render(text, True, pygame.Color("white"))
 
-    bar = pygame.Surface((WINDOW_WIDTH, ENGINE_FONT_SIZE + 10), pygame.SRCALPHA)
-    bar.fill((0, 0, 0, 150))
+async def next_frame(clock, frame_rate):
+    # Wait for the next frame and return the events since the last one
+    # With frame_rate None nothing on screen changes without input, so the desktop build sleeps in
+    # pygame.event.wait until an event arrives. The browser build leaves frame pacing to pygbag and
+    # must not block, since the engine task only runs while the game loop awaits.
+    if BROWSER:
+        clock.tick(FPS)
+        events = pygame.event.get()
+    elif frame_rate is None:
+        ev = pygame.event.wait(IDLE_TIMEOUT_MS)
+        events = [] if ev.type == pygame.NOEVENT else [ev] + pygame.event.get()
+    else:
+        clock.tick(frame_rate)
+        events = pygame.event.get()
+    await asyncio.sleep(0)
 
-    screen.blit(bar, (0, WINDOW_HEIGHT - (ENGINE_FONT_SIZE + 10)))
-    screen.blit(surf, (10, WINDOW_HEIGHT - (ENGINE_FONT_SIZE + 6)))
+    # The screen surface always holds the whole frame, so an uncovered window only needs it shown again
+    if any(ev.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED) for ev in events):
+        pygame.display.flip()
+    return events
 
 
-def choose_color(screen, clock):
+async def choose_color(screen, clock):
     font = pygame.font.SysFont(None, ENGINE_FONT_SIZE)
     prompt = font.render("Choose your side", True, pygame.Color("white"))
     btn_font = pygame.font.SysFont(None, LABEL_FONT_SIZE)
@@ -208,8 +387,20 @@ def choose_color(screen, clock):
     white_btn = pygame.Rect(start_x, y, btn_w, btn_h)
     black_btn = pygame.Rect(start_x + btn_w + 20, y, btn_w, btn_h)
 
+    # The prompt never changes, so it is drawn once and the loop only waits for input
+    screen.fill(pygame.Color("grey20"))
+    screen.blit(prompt, ((WINDOW_WIDTH - prompt.get_width()) // 2, y - btn_h - 30))
+
+    pygame.draw.rect(screen, pygame.Color("white"), white_btn)
+    screen.blit(w_surf, (white_btn.x + 10, white_btn.y + 5))
+
+    pygame.draw.rect(screen, pygame.Color("white"), black_btn)
+    screen.blit(b_surf, (black_btn.x + 10, black_btn.y + 5))
+
+    pygame.display.flip()
+
     while True:
-        for ev in pygame.event.get():
+        for ev in await next_frame(clock, None):
             if ev.type == pygame.QUIT:
                 pygame.quit()
                 exit()
@@ -220,20 +411,8 @@ def choose_color(screen, clock):
                 if black_btn.collidepoint(ev.pos):
                     return chess.BLACK
 
-        screen.fill(pygame.Color("grey20"))
-        screen.blit(prompt, ((WINDOW_WIDTH - prompt.get_width()) // 2, y - btn_h - 30))
-
-        pygame.draw.rect(screen, pygame.Color("white"), white_btn)
-        screen.blit(w_surf, (white_btn.x + 10, white_btn.y + 5))
-
-        pygame.draw.rect(screen, pygame.Color("white"), black_btn)
-        screen.blit(b_surf, (black_btn.x + 10, black_btn.y + 5))
-
-        pygame.display.flip()
-        clock.tick(FPS)
 
-
-def show_end_game_dialog(screen, clock, message):
+async def show_end_game_dialog(screen, clock, message):
     title_font = pygame.font.SysFont(None, ENGINE_FONT_SIZE)
     btn_font = pygame.font.SysFont(None, LABEL_FONT_SIZE)
 
@@ -251,8 +430,25 @@ def show_end_game_dialog(screen, clock, message):
     quit_surf = btn_font.render("Quit", True, pygame.Color("black"))
     quit_btn = pygame.Rect(x, y + btn_h + 10, btn_w, btn_h)
 
+    # Drawn once over the last frame of the game, the loop only waits for input
+    overlay = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
+    overlay.fill((0, 0, 0, 180))
+    screen.blit(overlay, (0, 0))
+
+    tx = (WINDOW_WIDTH - title_surf.get_width()) // 2
+    ty = (WINDOW_HEIGHT - title_surf.get_height()) // 2 - 20
+    screen.blit(title_surf, (tx, ty))
+
+    pygame.draw.rect(screen, pygame.Color("white"), restart_btn)
+    screen.blit(w_surf, (restart_btn.x + 10, restart_btn.y + 5))
+
+    pygame.draw.rect(screen, pygame.Color("white"), quit_btn)
+    screen.blit(quit_surf, (quit_btn.x + 10, quit_btn.y + 5))
+
+    pygame.display.flip()
+
     while True:
-        for ev in pygame.event.get():
+        for ev in await next_frame(clock, None):
             if ev.type == pygame.MOUSEBUTTONDOWN:
                 if restart_btn.collidepoint(ev.pos):
                     return "restart"
@@ -261,25 +457,210 @@ def show_end_game_dialog(screen, clock, message):
                     pygame.quit()
                     sys.exit()
 
-        overlay = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 180))
-        screen.blit(overlay, (0, 0))
-
-        tx = (WINDOW_WIDTH - title_surf.get_width()) // 2
-        ty = (WINDOW_HEIGHT - title_surf.get_height()) // 2 - 20
-        screen.blit(title_surf, (tx, ty))
-
-        pygame.draw.rect(screen, pygame.Color("white"), restart_btn)
-        screen.blit(w_surf, (restart_btn.x + 10, restart_btn.y + 5))
 
-        pygame.draw.rect(screen, pygame.Color("white"), quit_btn)
-        screen.blit(quit_surf, (quit_btn.x + 10, quit_btn.y + 5))
-
-        pygame.display.flip()
-        clock.tick(FPS)
+class EngineJob:
+    # One search handed to the engine thread
+    def __init__(self, kind, board, ponder_move=None):
+        self.kind = kind  # "search" or "ponder"
+        self.board = board
+        self.ponder_move = (
+            ponder_move  # For ponder jobs: the user move the search assumes
+        )
+        self.started = False
+        self.finished = False
+        self.start_time = None
+        self.deadline = None  # Set on a ponder hit: stop pondering at this time
+        self.hit = False  # Ponder hit: the user played ponder_move
+        self.stop_requested = False
+        self.discarded = False  # Ponder miss: the result is thrown away
+        self.depth = 0
+        self.best_move = None
+
+
+class EngineWorker:
+    # Runs the engine on a background thread so the pygame loop keeps handling events and drawing.
+    # Jobs go in through one queue and finished searches come back through another.
+
+    # Pondering
+    # After the engine moves, it keeps searching the position after the reply it expects from the user.
+    # If the user plays that move (a ponder hit), the running search simply becomes the engine's search
+    # and is given what is left of ENGINE_TIME_LIMIT. Otherwise it is discarded.
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.lock = threading.Lock()
+        self.current = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+
+            if not self.start(job):
+                continue
+
+            best_move = None
+            if job.kind == "search":
+                best_move = minimax_chess.get_prepared_move(job.board)
+            if best_move is None:
+                best_move, _, _ = minimax_chess.iterative_deepening(
+                    job.board, **self.search_limits(job)
+                )
+            self.finish(job, best_move)
+
+    def start(self, job):
+        # Make job the running search, returns False if it was discarded while queued
+        with self.lock:
+            if job.discarded:
+                return False
+            self.current = job
+            job.started = True
+            job.start_time = time.time()
+            if job.hit:
+                job.deadline = job.start_time + ENGINE_TIME_LIMIT
+            if job.stop_requested:
+                minimax_chess.stop_event.set()
+            else:
+                minimax_chess.stop_event.clear()
+
+        minimax_chess.transposition_table.new_search()
+        minimax_chess.age_move_ordering()
+        minimax_chess.new_search_stats()
+        return True
+
+    def search_limits(self, job):
+        # iterative_deepening arguments of job
+        def on_iteration(depth, best_move, best_eval):
+            job.depth = depth
+
+        if job.kind == "search":
+            return {
+                "time_limit": ENGINE_TIME_LIMIT,
+                "node_limit": ENGINE_NODE_LIMIT,
+                "info_callback": on_iteration,
+            }
+        # Ponder until the user moves or PONDER_TIME_LIMIT runs out
+        return {
+            "time_limit": PONDER_TIME_LIMIT,
+            "info_callback": on_iteration,
+        }
+
+    def finish(self, job, best_move):
+        with self.lock:
+            job.best_move = best_move
+            job.finished = True
+            self.current = None
+            if job.kind == "search" or job.hit:
+                self.results.put(job)
+
+    def submit(self, kind, board, ponder_move=None):
+        job = EngineJob(kind, board.copy(), ponder_move)
+        self.jobs.put_nowait(job)
+        return job
+
+    def ponder_hit(self, job):
+        # The user played the expected move, the ponder search now answers it
+        with self.lock:
+            job.hit = True
+            if job.finished:
+                self.results.put(job)
+            elif job.started:
+                job.deadline = max(time.time(), job.start_time + ENGINE_TIME_LIMIT)
+
+    def stop(self, job):
+        # Move now: end the search and play the best move found so far
+        with self.lock:
+            job.stop_requested = True
+            if self.current is job:
+                minimax_chess.stop_event.set()
+
+    def discard(self, job):
+        with self.lock:
+            job.discarded = True
+            if self.current is job:
+                minimax_chess.stop_event.set()
+
+    def update(self):
+        # Called every frame: stop a ponder hit search once its time is up
+        with self.lock:
+            job = self.current
+            if job is not None and job.deadline is not None:
+                if time.time() >= job.deadline:
+                    minimax_chess.stop_event.set()
+
+    def poll(self):
+        # Return the next finished search, or None
+        try:
+            return self.results.get_nowait()
+        except queue.Empty:
+            return None
+
+    def close(self):
+        with self.lock:
+            if self.current is not None:
+                self.current.discarded = True
+                minimax_chess.stop_event.set()
+        self.jobs.put_nowait(None)
+        self.thread.join()
+
+
+class AsyncEngineWorker(EngineWorker):
+    # EngineWorker for the browser build: the engine runs as a task on the asyncio event loop instead of a thread.
+    # cooperative_search yields to the loop every few hundred nodes, so the game loop keeps running
+    # between the slices of the search. The job handling and pondering are the same as EngineWorker.
+
+    def __init__(self):
+        self.jobs = asyncio.Queue()
+        self.results = queue.Queue()
+        self.lock = threading.Lock()
+        self.current = None
+        self.task = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        while True:
+            job = await self.jobs.get()
+            if job is None:
+                break
+            if not self.start(job):
+                continue
+
+            best_move = None
+            if job.kind == "search":
+                best_move = minimax_chess.get_prepared_move(job.board)
+            if best_move is None:
+                best_move, _, _ = await cooperative_search.iterative_deepening(
+                    job.board, **self.search_limits(job)
+                )
+            self.finish(job, best_move)
+
+    def close(self):
+        # The task stops the search at its next yield and then exits
+        with self.lock:
+            if self.current is not None:
+                self.current.discarded = True
+                minimax_chess.stop_event.set()
+        self.jobs.put_nowait(None)
+
+
+def record_capture(board, mv, white_captures, black_captures):
+    # Add the piece captured by mv (if any) to the captured pieces list of its color
+    if not board.is_capture(mv):
+        return
+
+    if board.is_en_passant(mv):
+        cap_sq = mv.to_square - 8 if board.turn == chess.WHITE else mv.to_square + 8
+    else:
+        cap_sq = mv.to_square
+    cap = board.piece_at(cap_sq)
+    if cap:
+        (white_captures if cap.color else black_captures).append(cap)
 
 
-def main():
+async def main():
     pygame.init()
     screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
     pygame.display.set_caption("Chess Engine with Minimax")
@@ -289,17 +670,22 @@ def main():
     clock = pygame.time.Clock()
     images = load_images()
     board = chess.Board()
+    minimax_chess.new_game()
 
-    user_color = choose_color(screen, clock)
+    user_color = await choose_color(screen, clock)
     orient_white = user_color == chess.WHITE
-    cpu_color = not user_color
 
     white_captures, black_captures = [], []
 
+    engine = AsyncEngineWorker() if BROWSER else EngineWorker()
+    engine_job = None  # The search whose move the engine will play
+    ponder_job = None  # The search running while the user thinks
+
     # Engine plays first if user chooses black
     if not orient_white:
-        eng = get_minimax_move(board, cpu_color)
-        board.push(eng)
+        engine_job = engine.submit("search", board)
+
+    renderer = Renderer(screen, images, orient_white)
 
     dragging = False
     drag_src_sq = None
@@ -307,10 +693,17 @@ def main():
     mouse_x = mouse_y = 0
 
     running = True
+    frame_rate = FPS
     while running:
-        for ev in pygame.event.get():
+        for ev in await next_frame(clock, frame_rate):
             if ev.type == pygame.QUIT:
                 running = False
+            elif (
+                ev.type == pygame.KEYDOWN
+                and ev.key == pygame.K_ESCAPE
+                and engine_job is not None
+            ):
+                engine.stop(engine_job)
             elif ev.type == pygame.MOUSEBUTTONDOWN and board.turn == user_color:
                 sq = screen_to_board(ev.pos, orient_white)
                 if sq is not None:
@@ -344,104 +737,97 @@ def main():
                             # Queenside castle
                             mv = chess.Move(king_sq, king_sq - 2)
 
-                if mv and board.is_capture(mv):
-                    if board.is_en_passant(mv):
-                        cap_sq = (
-                            mv.to_square - 8
-                            if board.turn == chess.WHITE
-                            else mv.to_square + 8
-                        )
-                    else:
-                        cap_sq = mv.to_square
-                    cap = board.piece_at(cap_sq)
-                    if cap:
-                        (white_captures if cap.color else black_captures).append(cap)
-
                 if mv and mv in board.legal_moves:
+                    record_capture(board, mv, white_captures, black_captures)
                     board.push(mv)
                     if board.is_checkmate():
                         winner = "White" if board.turn == chess.BLACK else "Black"
-                        choice = show_end_game_dialog(
+                        choice = await show_end_game_dialog(
                             screen, clock, f"{winner} wins by checkmate"
                         )
                         if choice == "restart":
-                            main()
+                            engine.close()
+                            await main()
                             return
 
-                    # Redraw
-                    screen.fill((50, 50, 50))
-                    draw_board(screen)
-                    draw_labels(screen, orient_white)
-                    draw_pieces(screen, board, images, None, orient_white)
-
-                    if orient_white:
-                        draw_captured(screen, images, white_captures, black_captures)
+                    # Engine Thinking, answered from the ponder search if the user played the expected move
+                    if ponder_job is not None and ponder_job.ponder_move == mv:
+                        engine.ponder_hit(ponder_job)
+                        engine_job = ponder_job
                     else:
-                        draw_captured(screen, images, black_captures, white_captures)
-
-                    pygame.display.flip()
-
-                    # Engine Thinking
-                    draw_engine_banner(screen, "Engine thinking…")
-                    pygame.display.flip()
-
-                    # Engine Move
-                    start = time.time()
-                    eng = get_minimax_move(board, cpu_color)
-                    if board.is_capture(eng):
-                        if board.is_en_passant(eng):
-                            cap_sq2 = (
-                                eng.to_square - 8
-                                if board.turn == chess.WHITE
-                                else eng.to_square + 8
-                            )
-                        else:
-                            cap_sq2 = eng.to_square
-
-                        cap2 = board.piece_at(cap_sq2)
-
-                        if cap2:
-                            (white_captures if cap2.color else black_captures).append(
-                                cap2
-                            )
-                    board.push(eng)
-                    if board.is_checkmate():
-                        winner = "White" if board.turn == chess.BLACK else "Black"
-                        choice = show_end_game_dialog(
-                            screen, clock, f"{winner} wins by checkmate"
-                        )
-                        if choice == "restart":
-                            main()
-                            return
-
-                    print(f"Engine moved {eng} in {time.time()-start:.2f}s")
+                        if ponder_job is not None:
+                            engine.discard(ponder_job)
+                        if not board.is_game_over():
+                            engine_job = engine.submit("search", board)
+                    ponder_job = None
 
                 dragging = False
                 drag_src_sq = None
                 drag_img = None
 
-        screen.fill((50, 50, 50))
-        draw_board(screen)
-        draw_labels(screen, orient_white)
-        draw_pieces(screen, board, images, drag_src_sq, orient_white)
+        # Engine Move
+        engine.update()
+        done = engine.poll()
+        if done is not None and done is engine_job:
+            eng = done.best_move
+            engine_job = None
+            record_capture(board, eng, white_captures, black_captures)
+            board.push(eng)
+            if board.is_checkmate():
+                winner = "White" if board.turn == chess.BLACK else "Black"
+                choice = await show_end_game_dialog(
+                    screen, clock, f"{winner} wins by checkmate"
+                )
+                if choice == "restart":
+                    engine.close()
+                    await main()
+                    return
+
+            print(
+                f"Engine moved {eng} in {time.time() - done.start_time:.2f}s "
+                f"(depth {done.depth})"
+            )
+
+            # Ponder on the reply the engine expects while the user thinks
+            expected = minimax_chess.get_ponder_move(board) if PONDER else None
+            if expected is not None:
+                ponder_board = board.copy()
+                ponder_board.push(expected)
+                if not ponder_board.is_game_over():
+                    ponder_job = engine.submit("ponder", ponder_board, expected)
+
+        banner_text = None
+        if engine_job is not None:
+            banner_text = (
+                f"Engine thinking… depth {engine_job.depth}, "
+                f"{minimax_chess.search_stats.nodes} nodes (Esc to move now)"
+            )
 
         if orient_white:
-            draw_captured(screen, images, white_captures, black_captures)
+            top_captures, bottom_captures = white_captures, black_captures
         else:
-            draw_captured(screen, images, black_captures, white_captures)
-
-        if dragging and drag_src_sq is not None:
-            draw_move_hints(screen, board, drag_src_sq, orient_white)
+            top_captures, bottom_captures = black_captures, white_captures
+        renderer.draw(
+            board,
+            top_captures,
+            bottom_captures,
+            drag_src_sq if dragging else None,
+            drag_img if dragging else None,
+            (mouse_x, mouse_y),
+            banner_text,
+        )
 
-        if dragging and drag_img:
-            screen.blit(
-                drag_img, (mouse_x - SQUARE_SIZE // 2, mouse_y - SQUARE_SIZE // 2)
-            )
-        pygame.display.flip()
-        clock.tick(FPS)
+        # Full frame rate only while a piece follows the mouse, otherwise wait for input
+        if dragging:
+            frame_rate = FPS
+        elif engine_job is not None:
+            frame_rate = ENGINE_FPS
+        else:
+            frame_rate = None
 
+    engine.close()
     pygame.quit()
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,8 +1,13 @@
 import chess
+import chess.polyglot
+import chess.syzygy
 import random
 import os
+import struct
+import threading
 import time
 import math
+from collections import OrderedDict
 
 PIECE_SQUARE_TABLES = {
     chess.PAWN: [
@@ -87,11 +92,487 @@ piece_values = {
     chess.QUEEN: 900,
     chess.KING: 0,
 }
-max_depth = 4
-recursion_count = 0
+max_depth = 3  # Search depth used when no time or node budget is given
+MAX_ITERATIVE_DEPTH = 64  # Hard cap on iterative deepening depth
+time_limit = None  # Seconds per move for iterative deepening (None for no limit)
+node_limit = None  # Nodes per move for iterative deepening (None for no limit)
+TIME_CHECK_INTERVAL = 256  # Nodes between wall-clock and stop checks
+QUIESCENCE_MAX_DEPTH = 8  # Capture plies searched past the horizon
+
+# Pruning and reductions, switch them off to compare nodes to depth
+null_move_pruning = True
+NULL_MOVE_REDUCTION = 2  # Extra plies taken off the search after a null move
+NULL_MOVE_MIN_DEPTH = 3  # Remaining depth needed to try a null move
+late_move_reductions = True
+LMR_MIN_DEPTH = 3  # Remaining depth needed to reduce a move
+LMR_MIN_MOVE_INDEX = 3  # Moves ordered before this one are never reduced
+LMR_REDUCTION = 1  # Plies taken off a late quiet move
+aspiration_windows = True
+ASPIRATION_MIN_DEPTH = (
+    2  # First iteration searched inside a window around the previous score
+)
+ASPIRATION_WINDOW = 50  # Half width of the first window
+ASPIRATION_MAX_WINDOW = (
+    800  # Past this half width the failing side is opened completely
+)
+
+# Move ordering scores: good captures, then killers, counter moves and quiet moves by history, then losing captures
+GOOD_CAPTURE_SCORE = 2_000_000
+KILLER_SCORE = 1_000_000
+COUNTER_MOVE_SCORE = 900_000
+HISTORY_MAX = 500_000  # History scores are halved once one reaches this
+HISTORY_AGING_DIVISOR = 4  # History scores are divided by this before every move
+BAD_CAPTURE_SCORE = -1_000_000
+
+# Budget of the search currently running
+search_deadline = None
+search_node_limit = None
+# Setting this event stops the running search, as if its budget ran out.
+# Anything with an is_set() method works, e.g. a multiprocessing.Event shared with worker processes.
+stop_event = threading.Event()
+# Profiling hook: called with search_stats every TIME_CHECK_INTERVAL nodes while set (see profile_search)
+sample_callback = None
+
+
+def build_piece_square_values():
+    # Material value plus piece square table value for every [color][piece_type][square]
+    # Black reads the table mirrored, exactly like evaluate_board always has
+    values = {chess.WHITE: {}, chess.BLACK: {}}
+    for piece_type, piece_table in PIECE_SQUARE_TABLES.items():
+        for color in (chess.WHITE, chess.BLACK):
+            row_values = []
+            for square in chess.SQUARES:
+                piece_x, piece_y = square % 8, square // 8
+                table_val = (
+                    piece_table[7 - piece_y][piece_x]
+                    if color == chess.BLACK
+                    else piece_table[piece_y][piece_x]
+                )
+                row_values.append(piece_values[piece_type] + table_val)
+            values[color][piece_type] = row_values
+    return values
+
+
+PIECE_SQUARE_VALUES = build_piece_square_values()
+
+
+def build_king_shield_masks():
+    # Bitboard of the squares directly and diagonally ahead of the king for every [color][king_square]
+    masks = {chess.WHITE: [], chess.BLACK: []}
+    for color in (chess.WHITE, chess.BLACK):
+        dr = 1 if color == chess.WHITE else -1
+        for king_square in chess.SQUARES:
+            f, r = chess.square_file(king_square), chess.square_rank(king_square)
+            mask = 0
+            for df in (-1, 0, 1):
+                nf, nr = f + df, r + dr
+                if 0 <= nf < 8 and 0 <= nr < 8:
+                    mask |= chess.BB_SQUARES[chess.square(nf, nr)]
+            masks[color].append(mask)
+    return masks
+
+
+KING_SHIELD_MASKS = build_king_shield_masks()
+
+
+def file_fill(bb):
+    # Every file with a piece of bb, as a bitboard of whole files
+    bb |= bb << 8
+    bb |= bb << 16
+    bb |= bb << 32
+    bb &= chess.BB_ALL
+    bb |= bb >> 8
+    bb |= bb >> 16
+    bb |= bb >> 32
+    return bb
+
+
+def adjacent_files(files):
+    # The files next to a bitboard of whole files
+    left = (files >> 1) & ~chess.BB_FILE_H
+    right = (files << 1) & ~chess.BB_FILE_A
+    return (left | right) & chess.BB_ALL
+
+
+def build_zobrist_piece_keys():
+    # Polyglot Zobrist key of every [color][piece_type][square], as used by chess.polyglot.zobrist_hash
+    keys = {chess.WHITE: {}, chess.BLACK: {}}
+    for piece_type in chess.PIECE_TYPES:
+        for color in (chess.WHITE, chess.BLACK):
+            piece_index = (piece_type - 1) * 2 + int(color)
+            keys[color][piece_type] = [
+                chess.polyglot.POLYGLOT_RANDOM_ARRAY[64 * piece_index + square]
+                for square in chess.SQUARES
+            ]
+    return keys
+
+
+ZOBRIST_PIECE_KEYS = build_zobrist_piece_keys()
+ZOBRIST_HASHER = chess.polyglot.ZobristHasher(chess.polyglot.POLYGLOT_RANDOM_ARRAY)
 
 EXACT, LOWERBOUND, UPPERBOUND = 0, 1, 2
-transposition_table = {}  # (depth_left, value, flag)
+tt_size_mb = 32  # Memory used by the transposition table
+PAWN_HASH_SIZE = 16384  # Entries in the pawn hash table
+EVAL_CACHE_SIZE = 200_000  # Static evaluations kept in the LRU eval cache
+
+# Opening book
+book_path = None  # Polyglot .bin opening book, None to search every position
+book_depth = 20  # Only use the book for the first book_depth plies of the game
+book_selection = (
+    "weighted"  # "weighted": random by entry weight, "best": highest weight
+)
+opening_book = None  # Memory-mapped reader for book_path, opened on first use
+
+# Endgame tablebases
+syzygy_path = (
+    None  # Directory of Syzygy WDL/DTZ files, None to disable tablebase probing
+)
+tablebase = None  # chess.syzygy.Tablebase for syzygy_path, opened on first use
+tablebase_pieces = 0  # Most pieces (kings included) of any table in syzygy_path
+TB_WIN_SCORE = (
+    100_000  # Score of a tablebase win, above any evaluation but below a checkmate
+)
+TB_CACHE_SIZE = 100_000  # WDL probe results kept in the LRU cache
+tablebase_cache = (
+    OrderedDict()
+)  # Zobrist key -> WDL (None if the position is not in the tables)
+
+
+class SearchTimeout(Exception):
+    # Raised inside the search when the time or node budget runs out
+    pass
+
+
+class SearchStats:
+    # Counters of one search, replaced by new_search_stats() before every search
+    # nodes counts every node, quiescence nodes included.
+    # The *_time fields are only filled while timing is on (see set_timing).
+
+    def __init__(self):
+        self.nodes = 0
+        self.qnodes = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.null_move_cutoffs = 0
+        self.reductions = 0
+        self.reduction_researches = 0
+        self.aspiration_researches = 0
+        self.pawn_probes = 0
+        self.pawn_hits = 0
+        self.eval_probes = 0
+        self.eval_hits = 0
+        self.iteration_nodes = []  # (depth, nodes when the iteration completed)
+        self.eval_time = 0.0
+        self.order_time = 0.0
+        self.movegen_time = 0.0
+        self.start_time = time.perf_counter()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def first_move_cutoff_rate(self):
+        # Share of beta cutoffs caused by the first move searched, a measure of move ordering quality
+        if self.beta_cutoffs == 0:
+            return 0.0
+        return self.first_move_cutoffs / self.beta_cutoffs
+
+    def branching_factors(self):
+        # Effective branching factor of every depth: nodes of the iteration / nodes of the previous iteration
+        factors = {}
+        previous = None
+        last_total = 0
+        for depth, total in self.iteration_nodes:
+            nodes = total - last_total
+            if previous:
+                factors[depth] = nodes / previous
+            previous = nodes
+            last_total = total
+        return factors
+
+    def as_dict(self):
+        return {
+            "nodes": self.nodes,
+            "qnodes": self.qnodes,
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "tt_cutoffs": self.tt_cutoffs,
+            "pawn_probes": self.pawn_probes,
+            "pawn_hits": self.pawn_hits,
+            "eval_probes": self.eval_probes,
+            "eval_hits": self.eval_hits,
+            "beta_cutoffs": self.beta_cutoffs,
+            "first_move_cutoff_rate": self.first_move_cutoff_rate(),
+            "null_move_cutoffs": self.null_move_cutoffs,
+            "reductions": self.reductions,
+            "reduction_researches": self.reduction_researches,
+            "aspiration_researches": self.aspiration_researches,
+            "branching_factors": self.branching_factors(),
+            "eval_time": self.eval_time,
+            "order_time": self.order_time,
+            "movegen_time": self.movegen_time,
+            "time": self.elapsed(),
+        }
+
+    def report(self):
+        elapsed = self.elapsed()
+        hit_rate = self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+        lines = [
+            f"Nodes: {self.nodes} ({self.qnodes} quiescence), "
+            f"{int(self.nodes / elapsed) if elapsed > 0 else 0} nps",
+            f"TT: {self.tt_probes} probes, {hit_rate:.1%} hits, {self.tt_cutoffs} cutoffs",
+            f"Pawn hash: {self.pawn_probes} probes, "
+            f"{self.pawn_hits / self.pawn_probes if self.pawn_probes else 0.0:.1%} hits",
+            f"Eval cache: {self.eval_probes} probes, "
+            f"{self.eval_hits / self.eval_probes if self.eval_probes else 0.0:.1%} hits",
+            f"Beta cutoffs: {self.beta_cutoffs}, {self.first_move_cutoff_rate():.1%} on the first move, "
+            f"{self.null_move_cutoffs} from null moves",
+            f"Late move reductions: {self.reductions}, {self.reduction_researches} re-searched",
+            f"Aspiration window re-searches: {self.aspiration_researches}",
+            "Branching factor: "
+            + ", ".join(
+                f"depth {depth} {factor:.2f}"
+                for depth, factor in self.branching_factors().items()
+            ),
+        ]
+        if self.eval_time or self.order_time or self.movegen_time:
+            lines.append(
+                f"Time: evaluate_board {self.eval_time:.2f}s, order_moves {self.order_time:.2f}s, "
+                f"move generation {self.movegen_time:.2f}s of {elapsed:.2f}s"
+            )
+        return "\n".join(lines)
+
+
+search_stats = SearchStats()
+
+
+def new_search_stats():
+    # Start counting a new search
+    global search_stats
+    search_stats = SearchStats()
+    return search_stats
+
+
+def encode_move(move):
+    # Pack a move into 16 bits: from square, to square and promotion piece type (0 for no move)
+    if move is None:
+        return 0
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(code):
+    if code == 0:
+        return None
+    return chess.Move(code & 63, (code >> 6) & 63, (code >> 12) or None)
+
+
+# Scores are stored as 30-bit integers, with these standing in for +-math.inf (checkmate)
+TT_VALUE_INF = (1 << 29) - 1
+
+
+class TranspositionTable:
+    # Fixed-size transposition table stored as packed entries in one flat buffer.
+    # Each slot holds (key, value, best move, depth_left, flag, age) and is indexed by key % num_entries.
+
+    # Entry layout: two 64-bit words (check, data)
+    # data = best move (16 bits) | depth_left (8) | age (8) | flag (2) | value (30)
+    # check = key ^ data, so an entry torn by two processes writing at the same time fails the key check.
+    # This lets worker processes share one table in shared memory without locks.
+
+    # Replacement policy
+    # An entry from an earlier search (older age) is always replaced.
+    # An entry from the current search is only replaced by the same position or by a search at least as deep.
+
+    ENTRY = struct.Struct("<QQ")
+
+    def __init__(self, size_mb=tt_size_mb, buffer=None):
+        # buffer: use existing memory (for example multiprocessing.shared_memory) instead of allocating
+        if buffer is not None:
+            self.data = memoryview(buffer).cast("B")
+            self.num_entries = len(self.data) // self.ENTRY.size
+            self.age = 0
+        else:
+            self.resize(size_mb)
+
+    def resize(self, size_mb):
+        self.num_entries = max(1, int(size_mb * 1024 * 1024) // self.ENTRY.size)
+        self.data = bytearray(self.num_entries * self.ENTRY.size)
+        self.age = 0
+
+    def clear(self):
+        self.data[:] = bytes(len(self.data))
+        self.age = 0
+
+    def new_search(self):
+        # Called before every move so entries of older searches become replaceable
+        self.age = (self.age + 1) & 0xFF
+
+    def probe(self, key):
+        # Return (depth_left, value, flag, best_move) or None if the position is not stored
+        check, data = self.ENTRY.unpack_from(
+            self.data, (key % self.num_entries) * self.ENTRY.size
+        )
+        if check ^ data != key:
+            return None
+
+        value = data >> 34
+        if value >= 1 << 29:
+            value -= 1 << 30
+        if value == TT_VALUE_INF:
+            value = math.inf
+        elif value == -TT_VALUE_INF:
+            value = -math.inf
+
+        depth_left = (data >> 16) & 0xFF
+        if depth_left >= 128:
+            depth_left -= 256
+
+        return depth_left, value, (data >> 32) & 3, decode_move(data & 0xFFFF)
+
+    def store(self, key, depth_left, value, flag, best_move=None):
+        offset = (key % self.num_entries) * self.ENTRY.size
+        check, data = self.ENTRY.unpack_from(self.data, offset)
+        if check ^ data == key:
+            # Keep the best move of an earlier search of this position if this one has none
+            if best_move is None:
+                best_move = decode_move(data & 0xFFFF)
+        elif (data >> 24) & 0xFF == self.age and (data >> 16) & 0xFF > depth_left:
+            return
+
+        if value == math.inf:
+            value = TT_VALUE_INF
+        elif value == -math.inf:
+            value = -TT_VALUE_INF
+
+        data = (
+            encode_move(best_move)
+            | (depth_left & 0xFF) << 16
+            | self.age << 24
+            | flag << 32
+            | (int(value) & ((1 << 30) - 1)) << 34
+        )
+        self.ENTRY.pack_into(self.data, offset, key ^ data, data)
+
+    def hashfull(self):
+        # Permille of the first 1000 slots used by the current search
+        sample = min(1000, self.num_entries)
+        used = 0
+        for i in range(sample):
+            check, data = self.ENTRY.unpack_from(self.data, i * self.ENTRY.size)
+            if check != 0 and (data >> 24) & 0xFF == self.age:
+                used += 1
+        return used * 1000 // sample
+
+
+# Kept between moves so each search reuses the work of the previous one
+transposition_table = TranspositionTable(tt_size_mb)
+
+
+class PawnHashTable:
+    # Pawn structure only changes on pawn moves and pawn captures, so most leaves share it with their siblings.
+    # Each slot caches the pawn terms of one pawn structure: (doubled, isolated, pawn_files), each indexed by color,
+    # where pawn_files is the bitboard of the files with a pawn of that color (also used by the rook open file term).
+    # The key is the pair of pawn bitboards, which identifies the structure exactly and costs nothing to build.
+    # A slot is always replaced by the newest structure that maps to it.
+
+    def __init__(self, size=PAWN_HASH_SIZE):
+        self.size = size
+        self.keys = [None] * size
+        self.entries = [None] * size
+
+    def clear(self):
+        self.keys = [None] * self.size
+        self.entries = [None] * self.size
+
+    def lookup(self, board):
+        white_pawns = board.pawns & board.occupied_co[chess.WHITE]
+        black_pawns = board.pawns & board.occupied_co[chess.BLACK]
+        key = (black_pawns, white_pawns)
+        index = hash(key) % self.size
+
+        search_stats.pawn_probes += 1
+        if self.keys[index] == key:
+            search_stats.pawn_hits += 1
+            return self.entries[index]
+
+        black_doubled, black_isolated, black_files = pawn_structure(black_pawns)
+        white_doubled, white_isolated, white_files = pawn_structure(white_pawns)
+        entry = (
+            (black_doubled, white_doubled),
+            (black_isolated, white_isolated),
+            (black_files, white_files),
+        )
+        self.keys[index] = key
+        self.entries[index] = entry
+        return entry
+
+
+def pawn_structure(pawns):
+    # (doubled, isolated, pawn_files) of one color's pawns
+    # Every pawn beyond the first on its file is doubled, every pawn with no friendly pawn on the files next to it is isolated
+    pawn_files = file_fill(pawns)
+    doubled = chess.popcount(pawns) - chess.popcount(pawn_files & chess.BB_RANK_1)
+    isolated = chess.popcount(pawns & ~adjacent_files(pawn_files))
+    return doubled, isolated, pawn_files
+
+
+pawn_hash_table = PawnHashTable()
+
+# Static evaluations by Zobrist key and target color, kept between moves and cleared by new_game
+eval_cache = OrderedDict()
+
+# Quiet move ordering heuristics, all updated on beta cutoffs
+# Killer moves: the last two quiet moves that caused a cutoff at each ply of the current search
+# History: butterfly table [from_square][to_square] of how often a quiet move caused a cutoff, weighted by depth
+# Counter moves: [from_square][to_square] of the previous move -> the quiet reply that refuted it
+killer_moves = [[None, None] for _ in range(MAX_ITERATIVE_DEPTH + 1)]
+history_table = [[0] * 64 for _ in range(64)]
+counter_moves = [[None] * 64 for _ in range(64)]
+
+
+def new_game():
+    # Forget everything learned in the previous game
+    transposition_table.clear()
+    pawn_hash_table.clear()
+    eval_cache.clear()
+    for ply_killers in killer_moves:
+        ply_killers[0] = ply_killers[1] = None
+    for from_square in range(64):
+        history_table[from_square] = [0] * 64
+        counter_moves[from_square] = [None] * 64
+
+
+def age_move_ordering():
+    # Called before every move: killers only make sense within one search,
+    # history is scaled down so the new position's cutoffs soon outweigh the old ones
+    for ply_killers in killer_moves:
+        ply_killers[0] = ply_killers[1] = None
+    for from_square in range(64):
+        history_table[from_square] = [
+            value // HISTORY_AGING_DIVISOR for value in history_table[from_square]
+        ]
+
+
+def update_quiet_cutoff(board, move, ply, depth_left):
+    # Remember a quiet move that caused a beta cutoff (called before the move is pushed)
+    if ply < len(killer_moves):
+        ply_killers = killer_moves[ply]
+        if ply_killers[0] != move:
+            ply_killers[1] = ply_killers[0]
+            ply_killers[0] = move
+
+    history_table[move.from_square][move.to_square] += depth_left * depth_left
+    if history_table[move.from_square][move.to_square] > HISTORY_MAX:
+        for from_square in range(64):
+            history_table[from_square] = [
+                value // 2 for value in history_table[from_square]
+            ]
+
+    if board.move_stack:
+        previous = board.move_stack[-1]
+        counter_moves[previous.from_square][previous.to_square] = move
 
 
 def clear_console():
@@ -114,60 +595,197 @@ def get_random_move(board):
     return random_move
 
 
+# Sort captures by “most valuable victim, least valuable attacker”
+# Captures sorted by (value_of_captured - value_of_attacker), non-captures last
+def capture_score(board, move):
+    if board.is_capture(move):
+        victim = board.piece_type_at(move.to_square) or 0
+        attacker = board.piece_type_at(move.from_square) or 0
+
+        return piece_values.get(victim, 0) - piece_values.get(attacker, 0)
+    return -1
+
+
+def generate_moves(board):
+    return list(board.legal_moves)
+
+
+def generate_captures(board):
+    # Captures and promotions for the quiescence search
+    return [
+        move for move in board.legal_moves if move.promotion or board.is_capture(move)
+    ]
+
+
 # Move ordering
-def order_moves(board):
+def order_moves(board, first_move=None, ply=None):
     # Pruning only happens when it gets good alpha or beta bounds early in the loop over moves.
     # If it examines “strong” moves first, it will raise alpha or or lower beta more quickly and prune more of the weaker moves that follow.
     # By sorting with Most Valuable Victim–Least Valuable Aggressor before recursing, it increases the likelihood of early pruning.
+    # Quiet moves are sorted by the killer, counter move and history heuristics, which remember quiet moves that caused cutoffs elsewhere in the tree.
 
-    moves = list(board.legal_moves)
+    moves = generate_moves(board)
+
+    killers = killer_moves[ply] if ply is not None and ply < len(killer_moves) else ()
+    counter_move = None
+    if board.move_stack:
+        previous = board.move_stack[-1]
+        counter_move = counter_moves[previous.from_square][previous.to_square]
 
-    # Sort captures by “most valuable victim, least valuable attacker”
-    # Captures sorted by (value_of_captured - value_of_attacker), non-captures last
     def move_score(move):
         if board.is_capture(move):
-            victim = board.piece_type_at(move.to_square) or 0
-            attacker = board.piece_type_at(move.from_square) or 0
+            score = capture_score(board, move)
+            if score >= 0:
+                return GOOD_CAPTURE_SCORE + score
+            return BAD_CAPTURE_SCORE + score
 
-            return piece_values.get(victim, 0) - piece_values.get(attacker, 0)
-        return -1
+        if move in killers:
+            return KILLER_SCORE - killers.index(move)
+        if move == counter_move:
+            return COUNTER_MOVE_SCORE
+        return history_table[move.from_square][move.to_square]
 
-    return sorted(moves, key=move_score, reverse=True)
+    moves.sort(key=move_score, reverse=True)
 
+    # The best move from the transposition table or the previous iteration goes first
+    if first_move is not None and first_move in moves:
+        moves.remove(first_move)
+        moves.insert(0, first_move)
 
-def evaluate_board(board, target_color):
-    # Terminal states
-    if board.is_checkmate():
-        return math.inf if board.turn != target_color else -math.inf
+    return moves
 
-    if board.is_stalemate() or board.is_insufficient_material():
-        return 0
 
+# Incremental material
+# The material and piece square table sum is kept from White's point of view.
+# Instead of walking every piece at each leaf, the search adds the change made by each move to the sum of its parent.
+def material_score(board):
+    # Full material and piece square table sum, from White's point of view
     score = 0
-
-    # Piece Material Values and Piece Square Table Values
     for square, piece in board.piece_map().items():
-        # Get value of all pieces on the board
-        piece_val = piece_values[piece.piece_type]
-        if piece.color == target_color:
+        piece_val = PIECE_SQUARE_VALUES[piece.color][piece.piece_type][square]
+        if piece.color == chess.WHITE:
             score += piece_val
         else:
             score -= piece_val
+    return score
 
-        # Squares of Pieces
-        piece_table = PIECE_SQUARE_TABLES[piece.piece_type]
-        piece_x, piece_y = square % 8, square // 8
 
-        # If the piece is Black, mirror the table
-        table_val = (
-            piece_table[7 - piece_y][piece_x]
-            if piece.color == chess.BLACK
-            else piece_table[piece_y][piece_x]
-        )
-        if piece.color == target_color:
-            score += table_val
+def move_deltas(board, move):
+    # Change in material_score and in the piece part of the Zobrist key made by move,
+    # computed before the move is pushed
+    piece_type = board.piece_type_at(move.from_square)
+    color = board.turn
+    own_values = PIECE_SQUARE_VALUES[color]
+    own_keys = ZOBRIST_PIECE_KEYS[color]
+
+    # The moving piece leaves its square and lands (possibly promoted) on the target square
+    to_type = move.promotion or piece_type
+    material = (
+        own_values[to_type][move.to_square] - own_values[piece_type][move.from_square]
+    )
+    key = own_keys[to_type][move.to_square] ^ own_keys[piece_type][move.from_square]
+
+    if board.is_castling(move):
+        # The rook jumps over the king as well
+        rank = chess.square_rank(move.from_square)
+        if board.is_kingside_castling(move):
+            king_to, rook_to, rook_file = (
+                chess.square(6, rank),
+                chess.square(5, rank),
+                7,
+            )
+        else:
+            king_to, rook_to, rook_file = (
+                chess.square(2, rank),
+                chess.square(3, rank),
+                0,
+            )
+
+        # Chess960 encodes castling as the king capturing its own rook
+        if board.piece_type_at(move.to_square) == chess.ROOK:
+            rook_from = move.to_square
         else:
-            score -= table_val
+            rook_from = chess.square(rook_file, rank)
+
+        material = (
+            own_values[chess.KING][king_to]
+            - own_values[chess.KING][move.from_square]
+            + own_values[chess.ROOK][rook_to]
+            - own_values[chess.ROOK][rook_from]
+        )
+        key = (
+            own_keys[chess.KING][king_to]
+            ^ own_keys[chess.KING][move.from_square]
+            ^ own_keys[chess.ROOK][rook_to]
+            ^ own_keys[chess.ROOK][rook_from]
+        )
+    elif board.is_en_passant(move):
+        captured_sq = move.to_square - 8 if color == chess.WHITE else move.to_square + 8
+        material += PIECE_SQUARE_VALUES[not color][chess.PAWN][captured_sq]
+        key ^= ZOBRIST_PIECE_KEYS[not color][chess.PAWN][captured_sq]
+    else:
+        captured = board.piece_type_at(move.to_square)
+        if captured:
+            material += PIECE_SQUARE_VALUES[not color][captured][move.to_square]
+            key ^= ZOBRIST_PIECE_KEYS[not color][captured][move.to_square]
+
+    return (material if color == chess.WHITE else -material), key
+
+
+def zobrist_state(board):
+    # Castling rights, en passant file and side to move part of the Zobrist key
+    return (
+        ZOBRIST_HASHER.hash_castling(board)
+        ^ ZOBRIST_HASHER.hash_ep_square(board)
+        ^ ZOBRIST_HASHER.hash_turn(board)
+    )
+
+
+def mobility(board, color):
+    # Pseudo-legal move count of color, read from attack bitboards instead of generating legal moves
+    # Pieces count every attacked square not occupied by their own side, pawns count their pushes and captures
+    own = board.occupied_co[color]
+    enemy = board.occupied_co[not color]
+    empty = ~board.occupied & chess.BB_ALL
+
+    count = 0
+    for square in chess.scan_forward(own & ~board.pawns):
+        count += chess.popcount(board.attacks_mask(square) & ~own)
+
+    pawns = board.pawns & own
+    if color == chess.WHITE:
+        single_pushes = chess.shift_up(pawns) & empty
+        double_pushes = chess.shift_up(single_pushes & chess.BB_RANK_3) & empty
+        left_captures = chess.shift_up_left(pawns) & enemy
+        right_captures = chess.shift_up_right(pawns) & enemy
+    else:
+        single_pushes = chess.shift_down(pawns) & empty
+        double_pushes = chess.shift_down(single_pushes & chess.BB_RANK_6) & empty
+        left_captures = chess.shift_down_left(pawns) & enemy
+        right_captures = chess.shift_down_right(pawns) & enemy
+
+    return (
+        count
+        + chess.popcount(single_pushes | double_pushes)
+        + chess.popcount(left_captures)
+        + chess.popcount(right_captures)
+    )
+
+
+def evaluate_board(board, target_color, material=None):
+    # material is the running material_score kept by the search, computed here if not given
+
+    # Terminal states
+    if board.is_checkmate():
+        return math.inf if board.turn != target_color else -math.inf
+
+    if board.is_stalemate() or board.is_insufficient_material():
+        return 0
+
+    # Piece Material Values and Piece Square Table Values
+    if material is None:
+        material = material_score(board)
+    score = material if target_color == chess.WHITE else -material
 
     # Is in Check
     if board.is_check():
@@ -177,82 +795,72 @@ def evaluate_board(board, target_color):
             score -= CHECK_PENALTY
 
     # Piece Mobility
-    temp_turn = board.turn
-    board.turn = target_color
+    score += MOBILITY_WEIGHT * (
+        mobility(board, target_color) - mobility(board, not target_color)
+    )
+
+    # King safety
+    # Both kings count, so the score for one side is exactly the negation of the score for the other (negamax needs that)
+    for color, sign in [(target_color, 1), (not target_color, -1)]:
+        king_square = board.king(color)
 
-    own_num_legal_moves = len(list(board.legal_moves))
-    board.turn = not target_color
-    opp_num_legal_moves = len(list(board.legal_moves))
-    score += MOBILITY_WEIGHT * (own_num_legal_moves - opp_num_legal_moves)
+        # Shield pawns directly ahead (and diagonally ahead)
+        shield = (
+            KING_SHIELD_MASKS[color][king_square]
+            & board.pawns
+            & board.occupied_co[color]
+        )
+        score += sign * KING_SHIELD_WEIGHT * chess.popcount(shield)
 
-    board.turn = temp_turn
+        # Penalty for attackers on king square
+        attackers = board.attackers_mask(not color, king_square)
+        score -= sign * KING_ATTACK_PENALTY * chess.popcount(attackers)
 
-    # King safety
-    king_square = board.king(target_color)
-
-    # Shield pawns directly ahead (and diagonally ahead)
-    f, r = chess.square_file(king_square), chess.square_rank(king_square)
-    directions = (
-        [(-1, 1), (0, 1), (1, 1)]
-        if target_color == chess.WHITE
-        else [(-1, -1), (0, -1), (1, -1)]
-    )
-    shield = 0
-    for df, dr in directions:
-        nf, nr = f + df, r + dr
-        if 0 <= nf < 8 and 0 <= nr < 8:
-            p = board.piece_type_at(chess.square(nf, nr))
-            if p == chess.PAWN and board.color_at(chess.square(nf, nr)) == target_color:
-                shield += 1
-    score += KING_SHIELD_WEIGHT * shield
-
-    # Penalty for attackers on king square
-    attackers = board.attackers(not target_color, king_square)
-    score -= KING_ATTACK_PENALTY * len(attackers)
+    own = board.occupied_co[target_color]
+    enemy = board.occupied_co[not target_color]
 
     # Bishop pair
-    if len(board.pieces(chess.BISHOP, target_color)) >= 2:
+    if chess.popcount(board.bishops & own) >= 2:
         score += BISHOP_PAIR_BONUS
-    if len(board.pieces(chess.BISHOP, not target_color)) >= 2:
+    if chess.popcount(board.bishops & enemy) >= 2:
         score -= BISHOP_PAIR_BONUS
 
-    # Rook on an open file
-    for rook_sq in board.pieces(chess.ROOK, target_color):
-        file = chess.square_file(rook_sq)
-        # if no friendly pawns on that file → open
-        if not any(
-            board.piece_type_at(chess.square(file, rr)) == chess.PAWN
-            and board.color_at(chess.square(file, rr)) == target_color
-            for rr in range(8)
-        ):
-            score += ROOK_OPEN_FILE_BONUS
-
-    for rook_sq in board.pieces(chess.ROOK, not target_color):
-        file = chess.square_file(rook_sq)
-        if not any(
-            board.piece_type_at(chess.square(file, rr)) == chess.PAWN
-            and board.color_at(chess.square(file, rr)) == (not target_color)
-            for rr in range(8)
-        ):
-            score -= ROOK_OPEN_FILE_BONUS
+    # Pawn structure terms come from the pawn hash table
+    doubled, isolated, pawn_files = pawn_hash_table.lookup(board)
+
+    # Rook on an open file (no friendly pawns on that file)
+    score += ROOK_OPEN_FILE_BONUS * (
+        chess.popcount(board.rooks & own & ~pawn_files[target_color])
+        - chess.popcount(board.rooks & enemy & ~pawn_files[not target_color])
+    )
 
     # Pawn structure
     for color, sign in [(target_color, 1), (not target_color, -1)]:
-        files = {f: 0 for f in range(8)}
-        pawn_sqs = list(board.pieces(chess.PAWN, color))
-        for sq in pawn_sqs:
-            files[chess.square_file(sq)] += 1
         # Doubled pawns
-        for f, count in files.items():
-            if count > 1:
-                score -= sign * DOUBLED_PAWN_PENALTY * (count - 1)
-
+        score -= sign * DOUBLED_PAWN_PENALTY * doubled[color]
         # Isolated pawns
-        for sq in pawn_sqs:
-            f = chess.square_file(sq)
-            if files.get(f - 1, 0) == 0 and files.get(f + 1, 0) == 0:
-                score -= sign * ISOLATED_PAWN_PENALTY
+        score -= sign * ISOLATED_PAWN_PENALTY * isolated[color]
+
+    return score
+
 
+def cached_evaluate(board, target_color, material, key):
+    # evaluate_board through the eval cache
+    # Transposition table entries are overwritten and only hold search results, while the same leaves are
+    # evaluated again and again across transpositions, iterations and moves. The cache is an LRU of
+    # EVAL_CACHE_SIZE static scores, so repeated positions skip the full evaluation.
+    cache_key = key << 1 | target_color
+    search_stats.eval_probes += 1
+    score = eval_cache.get(cache_key)
+    if score is not None:
+        search_stats.eval_hits += 1
+        eval_cache.move_to_end(cache_key)
+        return score
+
+    score = evaluate_board(board, target_color, material)
+    eval_cache[cache_key] = score
+    if len(eval_cache) > EVAL_CACHE_SIZE:
+        eval_cache.popitem(last=False)
     return score
 
 
@@ -262,8 +870,7 @@ def minimax(board, target_color, depth=0):
     # We recursively call the function and evaluate once we have reached the max depth
     # Choose highest or lowest the evaluation value: max or min nodes
 
-    global recursion_count
-    recursion_count += 1
+    search_stats.nodes += 1
 
     if depth == max_depth:
         return evaluate_board(board, target_color)
@@ -306,78 +913,288 @@ def minimax(board, target_color, depth=0):
         return min_eval_val
 
 
-# Minimax algorithm with alpha-beta pruning and a transposition table
-def minimax_alphabeta(board, target_color, alpha=-math.inf, beta=math.inf, depth=0):
+def check_search_limits():
+    # Abort the current iteration once the node budget or the deadline is reached
+    nodes = search_stats.nodes
+    if search_node_limit is not None and nodes >= search_node_limit:
+        raise SearchTimeout()
+
+    if nodes % TIME_CHECK_INTERVAL == 0:
+        if sample_callback is not None:
+            sample_callback(search_stats)
+        if search_deadline is not None and time.time() >= search_deadline:
+            raise SearchTimeout()
+        if stop_event.is_set():
+            raise SearchTimeout()
+
+
+# Quiescence search
+def quiescence(board, alpha, beta, material, qdepth=0, key=None):
+    # At the horizon the position may be in the middle of a capture sequence, so a static evaluation is unreliable.
+    # Keep searching captures and promotions (and every evasion when in check) until the position is quiet.
+
+    # Stand pat
+    # The side to move does not have to capture, so the static evaluation is a lower bound on the score.
+    # If it is already at least beta, return it without searching any capture.
+
+    search_stats.nodes += 1
+    search_stats.qnodes += 1
+    check_search_limits()
+
+    if key is None:
+        key = chess.polyglot.zobrist_hash(board)
+
+    in_check = board.is_check()
+    if qdepth >= QUIESCENCE_MAX_DEPTH or (
+        not in_check and board.is_insufficient_material()
+    ):
+        return cached_evaluate(board, board.turn, material, key)
+
+    if in_check:
+        # No standing pat when in check, every evasion is searched
+        moves = generate_moves(board)
+        if not moves:
+            return cached_evaluate(board, board.turn, material, key)
+        best = -math.inf
+    else:
+        best = cached_evaluate(board, board.turn, material, key)
+        if best >= beta:
+            return best
+        alpha = max(alpha, best)
+
+        moves = generate_captures(board)
+
+    moves.sort(key=lambda move: capture_score(board, move), reverse=True)
+    state_key = zobrist_state(board)
+
+    for move in moves:
+        material_change, key_change = move_deltas(board, move)
+        board.push(move)
+        score = -quiescence(
+            board,
+            -beta,
+            -alpha,
+            material + material_change,
+            qdepth + 1,
+            key ^ key_change ^ state_key ^ zobrist_state(board),
+        )
+        board.pop()
+
+        if score > best:
+            best = score
+        if score > alpha:
+            alpha = score
+        if alpha >= beta:
+            break
+
+    return best
+
+
+# Negamax alpha-beta search with principal variation search and a transposition table
+def minimax_alphabeta(
+    board,
+    alpha=-math.inf,
+    beta=math.inf,
+    depth=0,
+    search_depth=None,
+    material=None,
+    key=None,
+):
+    # Negamax
+    # Scores are always from the point of view of the side to move, so a child's score is the negation of its own.
+    # max(a, b) = -min(-a, -b), so one loop replaces the separate maximizing and minimizing steps.
+
     # Alpha-beta Pruning
-    # alpha: the best (highest) score that the maximizing side has found so far.
-    # Beta: the best (lowest) score that the minimizing side has found so far.
+    # alpha: the best score the side to move is already guaranteed.
+    # beta: the best score the opponent is already guaranteed, so anything at or above beta will be avoided by them.
+    # If alpha >= beta, we know the opponent will avoid this branch, so we can cut off the rest of the children without exploring them.
 
-    # At max node, try maximizing the score. For each recursive calll, find the highest alpha
-    # At min node, try minimizing the score. For each recursive calll, find the lowest beta
-    # If beta <= alpha, we know the opponent will avoid this branch, so we can cut off the rest of the children without exploring them.
+    # Principal Variation Search
+    # With good move ordering the first move is usually the best one, so it is searched with the full (alpha, beta) window.
+    # Every later move is searched with a null window (alpha, alpha + 1), which only proves it is no better than alpha and prunes much more.
+    # If a later move fails high (beats alpha), it is re-searched with the full window to get its exact score.
 
     # Transposition Table
-    # A transposition table is  a dictionary that stores the result of a previous alpha-beta search from the same position as (depth_remaining, value, flag).
+    # A transposition table stores the result of a previous alpha-beta search from the same position as (depth_remaining, value, flag, best_move).
+    # Positions are identified by their 64-bit Zobrist key, which the search updates move by move like the material sum.
     # When the same position is revisisted in a different move order, we can use the transposition table
 
     # Look up the stored entry if it is in the table
     # If it was an exact score, it can be returned immediately.
     # If it was at the lower bound or uppder bound we return it if it was greater than beta or less than alpha
 
-    global recursion_count, transposition_table
-    recursion_count += 1
+    search_stats.nodes += 1
+    check_search_limits()
 
-    key = board._transposition_key()
-    depth_left = max_depth - depth
+    if search_depth is None:
+        search_depth = max_depth
+    if material is None:
+        material = material_score(board)
+    if key is None:
+        key = chess.polyglot.zobrist_hash(board)
+
+    depth_left = search_depth - depth
 
     alpha_original = alpha
 
-    if key in transposition_table:
-        saved_depth, saved_val, saved_flag = transposition_table[key]
+    tt_move = None
+    search_stats.tt_probes += 1
+    entry = transposition_table.probe(key)
+    if entry is not None:
+        search_stats.tt_hits += 1
+        saved_depth, saved_val, saved_flag, tt_move = entry
         if saved_depth >= depth_left:
-            if saved_flag == EXACT:
-                return saved_val
-            if saved_flag == LOWERBOUND and saved_val >= beta:
-                return saved_val
-            if saved_flag == UPPERBOUND and saved_val <= alpha:
+            if (
+                saved_flag == EXACT
+                or (saved_flag == LOWERBOUND and saved_val >= beta)
+                or (saved_flag == UPPERBOUND and saved_val <= alpha)
+            ):
+                search_stats.tt_cutoffs += 1
                 return saved_val
 
-    # Max Depth reached or reached Terminal states
-    if depth == max_depth or board.is_game_over():
-        val = evaluate_board(board, target_color)
-        transposition_table[key] = (depth_left, val, EXACT)
+    # Endgame tablebases
+    # Positions in the tables have an exact result, so there is nothing to search below them.
+    # The result is stored with the deepest depth so the transposition table never searches it again.
+    if syzygy_path is not None and open_tablebase() and in_tablebase_range(board):
+        wdl = probe_wdl(board, key)
+        if wdl is not None:
+            val = tablebase_score(wdl)
+            transposition_table.store(key, MAX_ITERATIVE_DEPTH, val, EXACT)
+            return val
+
+    # Reached Terminal states
+    if board.is_game_over():
+        val = cached_evaluate(board, board.turn, material, key)
+        transposition_table.store(key, depth_left, val, EXACT)
         return val
 
-    if target_color == board.turn:
-        # Maximizing Step
-        best = -math.inf
-
-        for move in order_moves(board):
-            board.push(move)
-            score = minimax_alphabeta(board, target_color, alpha, beta, depth=depth + 1)
-            board.pop()
+    # Max Depth reached, settle captures with the quiescence search
+    if depth >= search_depth:
+        val = quiescence(board, alpha, beta, material, key=key)
+        if val <= alpha_original:
+            flag = UPPERBOUND
+        elif val >= beta:
+            flag = LOWERBOUND
+        else:
+            flag = EXACT
+        transposition_table.store(key, depth_left, val, flag)
+        return val
 
-            best = max(best, score)
+    state_key = zobrist_state(board)
+    in_check = board.is_check()
+
+    # Null-move pruning
+    # Let the opponent move twice: if a shallower search still fails high, the position is so good
+    # that a real move would fail high as well, so the node is cut off without searching any move.
+    # Passing is never better in zugzwang, so it is skipped when in check, when the side to move only has
+    # pawns left, after another null move and in principal variation nodes (full window).
+    if (
+        null_move_pruning
+        and depth > 0
+        and depth_left >= NULL_MOVE_MIN_DEPTH
+        and beta - alpha == 1
+        and beta != math.inf
+        and not in_check
+        and board.occupied_co[board.turn] & ~(board.pawns | board.kings)
+        and board.move_stack
+        and board.move_stack[-1]
+        and cached_evaluate(board, board.turn, material, key) >= beta
+    ):
+        board.push(chess.Move.null())
+        null_key = key ^ state_key ^ zobrist_state(board)
+        score = -minimax_alphabeta(
+            board,
+            -beta,
+            -beta + 1,
+            depth + 1,
+            search_depth - NULL_MOVE_REDUCTION,
+            material,
+            null_key,
+        )
+        board.pop()
+        if score >= beta:
+            search_stats.null_move_cutoffs += 1
+            return beta
 
-            # Alpha
-            alpha = max(alpha, score)
-            if beta <= alpha:
-                break
-    else:
-        # Minimizing Step
-        best = math.inf
+    best = -math.inf
+    best_move = None
 
-        for move in order_moves(board):
-            board.push(move)
-            score = minimax_alphabeta(board, target_color, alpha, beta, depth=depth + 1)
-            board.pop()
+    for move_index, move in enumerate(order_moves(board, tt_move, depth)):
+        quiet = not move.promotion and not board.is_capture(move)
+        material_change, key_change = move_deltas(board, move)
+        board.push(move)
+        child_material = material + material_change
+        child_key = key ^ key_change ^ state_key ^ zobrist_state(board)
+
+        # Late move reductions
+        # With good ordering, quiet moves late in the list rarely beat alpha, so they get a shallower null window
+        # search first and are only searched to the full depth if that beats alpha.
+        reduction = 0
+        if (
+            late_move_reductions
+            and move_index >= LMR_MIN_MOVE_INDEX
+            and alpha != -math.inf
+            and depth_left >= LMR_MIN_DEPTH
+            and quiet
+            and not in_check
+            and not board.is_check()
+        ):
+            reduction = LMR_REDUCTION
+            search_stats.reductions += 1
+
+        # Until some move has a score, alpha is -inf and the null window (inf, inf) would be empty
+        if move_index == 0 or alpha == -math.inf:
+            score = -minimax_alphabeta(
+                board, -beta, -alpha, depth + 1, search_depth, child_material, child_key
+            )
+        else:
+            # Null window, re-searched with the full window only if it fails high
+            score = -minimax_alphabeta(
+                board,
+                -alpha - 1,
+                -alpha,
+                depth + 1,
+                search_depth - reduction,
+                child_material,
+                child_key,
+            )
+            if reduction and score > alpha:
+                search_stats.reduction_researches += 1
+                score = -minimax_alphabeta(
+                    board,
+                    -alpha - 1,
+                    -alpha,
+                    depth + 1,
+                    search_depth,
+                    child_material,
+                    child_key,
+                )
+            if alpha < score < beta:
+                score = -minimax_alphabeta(
+                    board,
+                    -beta,
+                    -alpha,
+                    depth + 1,
+                    search_depth,
+                    child_material,
+                    child_key,
+                )
+        board.pop()
 
-            best = min(best, score)
+        if score > best:
+            best = score
+            best_move = move
 
-            # Beta
-            beta = min(beta, score)
-            if beta <= alpha:
-                break
+        # Alpha
+        if score > alpha:
+            alpha = score
+        if alpha >= beta:
+            search_stats.beta_cutoffs += 1
+            if move_index == 0:
+                search_stats.first_move_cutoffs += 1
+            if not board.is_capture(move):
+                update_quiet_cutoff(board, move, depth, depth_left)
+            break
 
     if best <= alpha_original:
         flag = UPPERBOUND
@@ -386,33 +1203,436 @@ def minimax_alphabeta(board, target_color, alpha=-math.inf, beta=math.inf, depth
     else:
         flag = EXACT
 
-    transposition_table[key] = (depth_left, best, flag)
+    transposition_table.store(key, depth_left, best, flag, best_move)
     return best
 
 
-def get_minimax_move(board, target_color):
-    global recursion_count, transposition_table
-    transposition_table = {}
-    recursion_count = 0
-
-    start_time = time.time()
-    # Maximizing for target_color player
-    best_move = None
+def search_root(board, root_moves, search_depth, alpha=-math.inf, beta=math.inf):
+    # Search every root move to search_depth inside (alpha, beta) and return (best_move, best_eval) for the side to move
+    # The first move gets the whole window, later moves a null window around the best score so far.
+    # best_eval <= alpha (fail low) or >= beta (fail high) is only a bound, see iterative_deepening.
+    best_move = root_moves[0]
     best_eval = -math.inf
+    material = material_score(board)
+    key = chess.polyglot.zobrist_hash(board)
+    state_key = zobrist_state(board)
 
-    for move in order_moves(board):
+    for move_index, move in enumerate(root_moves):
+        material_change, key_change = move_deltas(board, move)
         board.push(move)
-        current_eval = minimax_alphabeta(
-            board, target_color, alpha=-math.inf, beta=math.inf, depth=1
-        )
+        child_material = material + material_change
+        child_key = key ^ key_change ^ state_key ^ zobrist_state(board)
+
+        if move_index == 0 or alpha == -math.inf:
+            current_eval = -minimax_alphabeta(
+                board, -beta, -alpha, 1, search_depth, child_material, child_key
+            )
+        else:
+            current_eval = -minimax_alphabeta(
+                board,
+                -alpha - 1,
+                -alpha,
+                1,
+                search_depth,
+                child_material,
+                child_key,
+            )
+            if alpha < current_eval < beta:
+                current_eval = -minimax_alphabeta(
+                    board,
+                    -beta,
+                    -alpha,
+                    1,
+                    search_depth,
+                    child_material,
+                    child_key,
+                )
+        board.pop()
+
         if current_eval > best_eval:
             best_eval = current_eval
             best_move = move
+        if current_eval > alpha:
+            alpha = current_eval
+        if alpha >= beta:
+            break
+
+    return best_move, best_eval
+
+
+def iterative_deepening(
+    board,
+    time_limit=None,
+    node_limit=None,
+    depth_limit=None,
+    start_depth=1,
+    root_rotation=0,
+    info_callback=None,
+):
+    # Iterative deepening
+    # Search depth 1, 2, 3, ... and keep the best move of the last completed iteration.
+    # When a time or node budget is given, deepen until it runs out (or depth_limit), otherwise stop at max_depth.
+    # The best move of each iteration is tried first in the next one, which gives alpha a good bound early.
+    # start_depth and root_rotation let parallel helpers search different depths and root move orders.
+    # info_callback(depth, best_move, best_eval) is called after every completed iteration.
+    # Returns (best_move, best_eval, completed_depth) for the side to move.
+
+    global search_deadline, search_node_limit
+
+    start_time = time.time()
+    search_deadline = start_time + time_limit if time_limit is not None else None
+    search_node_limit = node_limit
+    if depth_limit is not None:
+        depth_cap = depth_limit
+    elif time_limit is not None or node_limit is not None:
+        depth_cap = MAX_ITERATIVE_DEPTH
+    else:
+        depth_cap = max_depth
 
+    # Start from the best move stored by an earlier search of this position
+    root_key = chess.polyglot.zobrist_hash(board)
+    entry = transposition_table.probe(root_key)
+    root_moves = order_moves(board, entry[3] if entry is not None else None, 0)
+    if not root_moves:
+        return None, evaluate_board(board, board.turn), 0
+
+    if root_rotation and len(root_moves) > 2:
+        # Keep the first move, rotate the rest
+        shift = root_rotation % (len(root_moves) - 1)
+        root_moves[1:] = root_moves[1 + shift :] + root_moves[1 : 1 + shift]
+
+    best_move = root_moves[0]
+    best_eval = -math.inf
+    completed_depth = 0
+    stack_size = len(board.move_stack)
+
+    try:
+        for search_depth in range(min(start_depth, depth_cap), depth_cap + 1):
+            # Aspiration windows
+            # The score rarely moves far from one iteration to the next, so the root is searched inside a window
+            # around the previous score, which cuts off much more than the full window.
+            # If the score falls outside, the root result is only a bound: it is stored as one in the
+            # transposition table and the root is searched again with the failing side of the window widened.
+            alpha, beta = -math.inf, math.inf
+            delta = ASPIRATION_WINDOW
+            if (
+                aspiration_windows
+                and completed_depth
+                and search_depth >= ASPIRATION_MIN_DEPTH
+                and abs(best_eval) < TB_WIN_SCORE
+            ):
+                alpha, beta = best_eval - delta, best_eval + delta
+
+            while True:
+                move, value = search_root(board, root_moves, search_depth, alpha, beta)
+                if value <= alpha and alpha != -math.inf:
+                    flag = UPPERBOUND
+                elif value >= beta and beta != math.inf:
+                    flag = LOWERBOUND
+                    # The move that failed high is searched first next time
+                    root_moves.remove(move)
+                    root_moves.insert(0, move)
+                else:
+                    break
+
+                search_stats.aspiration_researches += 1
+                transposition_table.store(
+                    root_key,
+                    search_depth,
+                    value,
+                    flag,
+                    move if flag == LOWERBOUND else None,
+                )
+                delta *= 2
+                if flag == UPPERBOUND:
+                    alpha = (
+                        value - delta if delta < ASPIRATION_MAX_WINDOW else -math.inf
+                    )
+                else:
+                    beta = value + delta if delta < ASPIRATION_MAX_WINDOW else math.inf
+
+            best_move, best_eval = move, value
+            completed_depth = search_depth
+            search_stats.iteration_nodes.append((search_depth, search_stats.nodes))
+            transposition_table.store(
+                root_key, search_depth, best_eval, EXACT, best_move
+            )
+
+            if info_callback is not None:
+                info_callback(search_depth, best_move, best_eval)
+
+            # Try the best move first in the next iteration
+            root_moves.remove(best_move)
+            root_moves.insert(0, best_move)
+
+            # A forced mate will not change with more depth
+            if best_eval in (math.inf, -math.inf):
+                break
+    except SearchTimeout:
+        # Unwind the moves that were pushed when the budget ran out
+        while len(board.move_stack) > stack_size:
+            board.pop()
+    finally:
+        search_deadline = None
+        search_node_limit = None
+
+    return best_move, best_eval, completed_depth
+
+
+# Profiling
+# Timing every call costs more than the calls themselves on small functions, so it is off by default.
+# set_timing(True) replaces the timed functions with wrappers that add their time to search_stats.
+# order_moves time includes the move generation it calls.
+TIMED_FUNCTIONS = {
+    "evaluate_board": "eval_time",
+    "order_moves": "order_time",
+    "generate_moves": "movegen_time",
+    "generate_captures": "movegen_time",
+}
+untimed_functions = {}
+
+
+def timed(function, field):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            setattr(
+                search_stats,
+                field,
+                getattr(search_stats, field) + time.perf_counter() - start,
+            )
+
+    return wrapper
+
+
+def set_timing(enabled):
+    module = globals()
+    for name, field in TIMED_FUNCTIONS.items():
+        if enabled and name not in untimed_functions:
+            untimed_functions[name] = module[name]
+            module[name] = timed(module[name], field)
+        elif not enabled and name in untimed_functions:
+            module[name] = untimed_functions.pop(name)
+
+
+def profile_search(
+    board,
+    time_limit=None,
+    node_limit=None,
+    depth_limit=None,
+    profiler=None,
+    sampler=None,
+    timing=True,
+):
+    # Run one search with profiling hooks attached and return (best_move, best_eval, completed_depth, stats)
+    # profiler: e.g. a cProfile.Profile, enabled for this search only
+    # sampler: called with the live search_stats every TIME_CHECK_INTERVAL nodes
+    global sample_callback
+
+    transposition_table.new_search()
+    age_move_ordering()
+    stats = new_search_stats()
+    set_timing(timing)
+    sample_callback = sampler
+    if profiler is not None:
+        profiler.enable()
+    try:
+        best_move, best_eval, completed_depth = iterative_deepening(
+            board, time_limit, node_limit, depth_limit
+        )
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        sample_callback = None
+        set_timing(False)
+
+    return best_move, best_eval, completed_depth, stats
+
+
+def set_book(path):
+    # Switch to another opening book (None disables the book)
+    global book_path, opening_book
+    if opening_book is not None:
+        opening_book.close()
+    book_path = path
+    opening_book = None
+
+
+def get_book_move(board):
+    # Opening book
+    # A Polyglot book is a file of 16-byte entries (Zobrist key, move, weight) sorted by key.
+    # The file is memory-mapped and binary-searched by the key of the position, so it is never loaded into memory
+    # and processes using the same book share the mapped pages.
+    # Returns None when there is no book, the game is past book_depth or the position is not in the book.
+    global opening_book
+    if book_path is None or board.ply() >= book_depth:
+        return None
+
+    if opening_book is None:
+        opening_book = chess.polyglot.open_reader(book_path)
+
+    try:
+        if book_selection == "best":
+            return opening_book.find(board).move
+        return opening_book.weighted_choice(board).move
+    except IndexError:
+        return None
+
+
+def set_syzygy_path(path):
+    # Switch to another tablebase directory (None disables probing)
+    global syzygy_path, tablebase, tablebase_pieces
+    if tablebase is not None:
+        tablebase.close()
+    syzygy_path = path
+    tablebase = None
+    tablebase_pieces = 0
+    tablebase_cache.clear()
+
+
+def open_tablebase():
+    # Open syzygy_path on first use, returns False if probing is disabled
+    global tablebase, tablebase_pieces
+    if syzygy_path is None:
+        return False
+
+    if tablebase is None:
+        tablebase = chess.syzygy.open_tablebase(syzygy_path)
+        # Table names look like KQvKR, one letter per piece
+        tablebase_pieces = max((len(name) - 1 for name in tablebase.wdl), default=0)
+    return True
+
+
+def probe_wdl(board, key):
+    # Win/draw/loss of the side to move from the tablebases (2 win, 1 cursed win, 0 draw, -1 blessed loss, -2 loss)
+    # Returns None if the position is not in the tables. Results are kept in an LRU cache by Zobrist key.
+    if key in tablebase_cache:
+        tablebase_cache.move_to_end(key)
+        return tablebase_cache[key]
+
+    try:
+        wdl = tablebase.probe_wdl(board)
+    except KeyError:
+        # Missing table, castling rights or too many pieces
+        wdl = None
+
+    tablebase_cache[key] = wdl
+    if len(tablebase_cache) > TB_CACHE_SIZE:
+        tablebase_cache.popitem(last=False)
+    return wdl
+
+
+def tablebase_score(wdl):
+    # Cursed wins and blessed losses are draws under the 50 move rule
+    if wdl == 2:
+        return TB_WIN_SCORE
+    if wdl == -2:
+        return -TB_WIN_SCORE
+    return 0
+
+
+def in_tablebase_range(board):
+    return (
+        chess.popcount(board.occupied) <= tablebase_pieces and not board.castling_rights
+    )
+
+
+def get_tablebase_move(board):
+    # Endgame tablebases
+    # With few enough pieces the result of every position is known exactly from Syzygy tables.
+    # At the root, play the move with the best WDL for us, winning as fast (by DTZ) or losing as slowly as possible.
+    if not open_tablebase() or not in_tablebase_range(board):
+        return None
+
+    best_move = None
+    best_rank = None
+    for move in board.legal_moves:
+        board.push(move)
+        try:
+            # WDL and DTZ of the position after the move are from the opponent's point of view
+            wdl = -tablebase.probe_wdl(board)
+            dtz = abs(tablebase.probe_dtz(board))
+        except KeyError:
+            board.pop()
+            return None
         board.pop()
 
+        if board.is_zeroing(move):
+            # A capture or pawn move resets the 50 move counter
+            dtz = 0
+
+        # Win quickly, lose slowly
+        rank = (wdl, -dtz if wdl > 0 else dtz)
+        if best_rank is None or rank > best_rank:
+            best_rank = rank
+            best_move = move
+
+    return best_move
+
+
+def get_prepared_move(board):
+    # Moves that need no search: the opening book, then the endgame tablebases
+    book_move = get_book_move(board)
+    if book_move is not None:
+        return book_move
+    return get_tablebase_move(board)
+
+
+def get_ponder_move(board):
+    # The reply the engine expects in this position: the best move stored in the transposition table
+    entry = transposition_table.probe(chess.polyglot.zobrist_hash(board))
+    if entry is None or entry[3] is None or entry[3] not in board.legal_moves:
+        return None
+    return entry[3]
+
+
+def get_principal_variation(board, best_move, max_length):
+    # The expected line after best_move, followed through the best moves stored in the transposition table
+    board = board.copy()
+    pv = [best_move]
+    board.push(best_move)
+    seen = {chess.polyglot.zobrist_hash(board)}
+
+    while len(pv) < max_length:
+        move = get_ponder_move(board)
+        if move is None:
+            break
+        board.push(move)
+
+        # Stop at a repetition, the stored moves could loop forever
+        key = chess.polyglot.zobrist_hash(board)
+        if key in seen:
+            break
+        seen.add(key)
+        pv.append(move)
+
+    return pv
+
+
+def get_minimax_move(board, target_color, time_limit=None, node_limit=None):
+    # Maximizing for target_color player, which is the side to move
+    prepared_move = get_prepared_move(board)
+    if prepared_move is not None:
+        print(f"Book or tablebase move {prepared_move}")
+        return prepared_move
+    transposition_table.new_search()
+    age_move_ordering()
+    new_search_stats()
+
+    if time_limit is None:
+        time_limit = globals()["time_limit"]
+    if node_limit is None:
+        node_limit = globals()["node_limit"]
+
+    start_time = time.time()
+    best_move, _, completed_depth = iterative_deepening(board, time_limit, node_limit)
+
     end_time = time.time()
-    print(f"Minimax took {(end_time - start_time):.2f}s to move")
+    print(
+        f"Minimax took {(end_time - start_time):.2f}s to move (depth {completed_depth})"
+    )
 
     return best_move
 
@@ -420,6 +1640,7 @@ def get_minimax_move(board, target_color):
 if __name__ == "__main__":
     gameOver = False
     board = chess.Board()
+    new_game()
 
     playerChoice = input("Choose black or white (B or W)")
     while playerChoice not in ["B", "W", "b", "w"]:
@@ -440,7 +1661,7 @@ if __name__ == "__main__":
             move = get_user_move(board)
         else:
             move = get_minimax_move(board, cpuColor)
-            print(f"Recursion count: {recursion_count}")
+            print(search_stats.report())
 
         print(f"{'WHITE' if board.turn else 'BLACK'} played: {move}")
 
@@ -0,0 +1,234 @@
+import argparse
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import chess
+
+import minimax_chess
+from minimax_chess import TranspositionTable
+
+# Lazy SMP
+# Several processes search the same root position at the same time and share one transposition table.
+# They do not split the tree between them: each helper runs its own iterative deepening,
+# starting at a different depth and with a different root move order, and fills the table with results
+# the main search then finds instead of searching them itself.
+# The table lives in multiprocessing.shared_memory and its entries are lock-free (see TranspositionTable).
+# The main process returns the deepest completed result of all searches.
+
+
+def helper_main(shm_name, job_queue, result_queue, stop_event):
+    # Worker process: attach to the shared table and search every root position it is sent
+    shm = shared_memory.SharedMemory(name=shm_name)
+
+    minimax_chess.transposition_table = TranspositionTable(buffer=shm.buf)
+    minimax_chess.stop_event = stop_event
+
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+
+        (
+            root_fen,
+            chess960,
+            moves,
+            age,
+            time_limit,
+            node_limit,
+            depth_limit,
+            start_depth,
+            root_rotation,
+        ) = job
+
+        # Replay the game so repetitions are seen the same way as in the main process
+        board = chess.Board(root_fen, chess960=chess960)
+        for uci in moves:
+            board.push_uci(uci)
+
+        minimax_chess.transposition_table.age = age
+        minimax_chess.age_move_ordering()
+        minimax_chess.new_search_stats()
+
+        best_move, best_eval, completed_depth = minimax_chess.iterative_deepening(
+            board,
+            time_limit,
+            node_limit,
+            depth_limit,
+            start_depth=start_depth,
+            root_rotation=root_rotation,
+        )
+        result_queue.put(
+            (
+                best_move.uci() if best_move is not None else None,
+                best_eval,
+                completed_depth,
+                minimax_chess.search_stats.nodes,
+            )
+        )
+
+    minimax_chess.transposition_table = None
+    shm.close()
+
+
+class ParallelSearch:
+    # Owns the shared transposition table and the helper processes, which stay alive between moves
+    # While it is open, the main process searches with the shared table as well.
+
+    def __init__(self, threads, size_mb=None):
+        if size_mb is None:
+            size_mb = minimax_chess.tt_size_mb
+
+        self.threads = max(1, threads)
+        size = max(1, int(size_mb * 1024 * 1024)) // TranspositionTable.ENTRY.size
+        self.shm = shared_memory.SharedMemory(
+            create=True, size=size * TranspositionTable.ENTRY.size
+        )
+        self.shm.buf[:] = bytes(self.shm.size)
+
+        self.previous_table = minimax_chess.transposition_table
+        self.previous_stop_event = minimax_chess.stop_event
+        minimax_chess.transposition_table = TranspositionTable(buffer=self.shm.buf)
+
+        self.stop_event = multiprocessing.Event()
+        minimax_chess.stop_event = self.stop_event
+
+        self.result_queue = multiprocessing.Queue()
+        self.job_queues = []
+        self.helpers = []
+        for _ in range(self.threads - 1):
+            job_queue = multiprocessing.Queue()
+            helper = multiprocessing.Process(
+                target=helper_main,
+                args=(self.shm.name, job_queue, self.result_queue, self.stop_event),
+                daemon=True,
+            )
+            helper.start()
+            self.job_queues.append(job_queue)
+            self.helpers.append(helper)
+
+    def search(
+        self,
+        board,
+        time_limit=None,
+        node_limit=None,
+        depth_limit=None,
+        info_callback=None,
+    ):
+        # Returns (best_move, best_eval, completed_depth, total_nodes) of the deepest completed search
+        # info_callback is called after every iteration of the main search, like in iterative_deepening.
+        # The stop event is cleared after every search, so a stop that arrives before the search starts is kept.
+        table = minimax_chess.transposition_table
+        table.new_search()
+        minimax_chess.age_move_ordering()
+        minimax_chess.new_search_stats()
+
+        root = board.root()
+        moves = [move.uci() for move in board.move_stack]
+        for helper_index, job_queue in enumerate(self.job_queues, start=1):
+            # Half of the helpers start one ply deeper, each helper uses its own root move order
+            job_queue.put(
+                (
+                    root.fen(),
+                    board.chess960,
+                    moves,
+                    table.age,
+                    time_limit,
+                    node_limit,
+                    depth_limit,
+                    1 + helper_index % 2,
+                    helper_index,
+                )
+            )
+
+        best_move, best_eval, completed_depth = minimax_chess.iterative_deepening(
+            board, time_limit, node_limit, depth_limit, info_callback=info_callback
+        )
+        total_nodes = minimax_chess.search_stats.nodes
+
+        # The main search is done, stop the helpers and take a deeper result if one finished
+        self.stop_event.set()
+        for _ in self.helpers:
+            uci, helper_eval, helper_depth, helper_nodes = self.result_queue.get()
+            total_nodes += helper_nodes
+            if uci is not None and helper_depth > completed_depth:
+                best_move = chess.Move.from_uci(uci)
+                best_eval = helper_eval
+                completed_depth = helper_depth
+        self.stop_event.clear()
+
+        return best_move, best_eval, completed_depth, total_nodes
+
+    def close(self):
+        for job_queue in self.job_queues:
+            job_queue.put(None)
+        for helper in self.helpers:
+            helper.join()
+
+        minimax_chess.transposition_table = self.previous_table
+        minimax_chess.stop_event = self.previous_stop_event
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def get_parallel_move(board, target_color, threads, time_limit=None, node_limit=None):
+    # One-off parallel search, like get_minimax_move
+    with ParallelSearch(threads) as searcher:
+        start_time = time.time()
+        best_move, _, completed_depth, _ = searcher.search(
+            board, time_limit, node_limit
+        )
+        print(
+            f"Minimax took {(time.time() - start_time):.2f}s to move "
+            f"(depth {completed_depth}, {threads} processes)"
+        )
+    return best_move
+
+
+BENCH_FENS = [
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP3PPP/R2QKB1R w KQ - 0 8",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+]
+
+
+def bench_speedup(thread_counts, depth):
+    # Time to depth for every number of processes, and the speedup over one process
+    results = []
+    for threads in thread_counts:
+        with ParallelSearch(threads) as searcher:
+            elapsed = 0.0
+            nodes = 0
+            for fen in BENCH_FENS:
+                minimax_chess.new_game()
+                start_time = time.time()
+                _, _, _, search_nodes = searcher.search(
+                    chess.Board(fen), depth_limit=depth
+                )
+                elapsed += time.time() - start_time
+                nodes += search_nodes
+        results.append((threads, elapsed, nodes))
+
+    base_time = results[0][1]
+    print(f"{'processes':>9} {'time':>8} {'nodes':>9} {'speedup':>8}")
+    for threads, elapsed, nodes in results:
+        print(f"{threads:>9} {elapsed:>7.2f}s {nodes:>9} {base_time / elapsed:>7.2f}x")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Lazy SMP time-to-depth benchmark over a fixed set of positions"
+    )
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--depth", type=int, default=4)
+    args = parser.parse_args()
+
+    bench_speedup(args.threads, args.depth)
@@ -0,0 +1,400 @@
+import argparse
+import ast
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import chess
+import chess.pgn
+
+import minimax_chess
+
+# Self-play match
+# Two engine configurations play game pairs from an opening set, each opening once with either color.
+# A configuration is a set of minimax_chess module settings (e.g. late_move_reductions=False).
+# Games run concurrently on a process pool. After every game the Elo difference and a sequential
+# probability ratio test (SPRT) are updated, and the match stops as soon as the SPRT accepts
+# either hypothesis. Games are written as PGN and per-game node counts and NPS as JSONL.
+# Once the SPRT decides, a shared event stops the games still running at their current move.
+
+MAX_PLIES = 300  # Games still running after this many plies are adjudicated as draws
+
+DEFAULT_OPENINGS = [
+    "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/pppp1ppp/4p3/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/pp1ppppp/2p5/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/ppp1pppp/8/3p4/3P4/8/PPP1PPPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkb1r/pppppppp/5n2/8/3P4/8/PPP1PPPP/RNBQKBNR w KQkq - 1 2",
+    "rnbqkbnr/pppppppp/8/8/2P5/8/PP1PPPPP/RNBQKBNR b KQkq - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/5N2/PPPPPPPP/RNBQKB1R b KQkq - 1 1",
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "rnbqkb1r/pppp1ppp/5n2/4p3/4P3/2N5/PPPP1PPP/R1BQKBNR w KQkq - 2 3",
+]
+
+players = {}  # Engines of this worker process by name
+default_settings = {}  # minimax_chess values of every setting some engine overrides
+match_stop = None  # Set by the parent process when the match is decided
+
+
+def parse_options(text):
+    # "name=value,name=value" to a dict of minimax_chess settings
+    options = {}
+    if not text:
+        return options
+    for item in text.split(","):
+        name, value = item.split("=", 1)
+        name = name.strip()
+        if not hasattr(minimax_chess, name):
+            raise ValueError(f"minimax_chess has no setting {name}")
+        options[name] = ast.literal_eval(value.strip())
+    return options
+
+
+def new_engine_state():
+    # The minimax_chess tables every engine needs its own copy of, sized by the current minimax_chess settings
+    return {
+        "transposition_table": minimax_chess.TranspositionTable(
+            minimax_chess.tt_size_mb
+        ),
+        "pawn_hash_table": minimax_chess.PawnHashTable(minimax_chess.PAWN_HASH_SIZE),
+        "eval_cache": OrderedDict(),
+        "killer_moves": [
+            [None, None] for _ in range(minimax_chess.MAX_ITERATIVE_DEPTH + 1)
+        ],
+        "history_table": [[0] * 64 for _ in range(64)],
+        "counter_moves": [[None] * 64 for _ in range(64)],
+    }
+
+
+class Player:
+    # One engine configuration with its own tables, swapped into minimax_chess before each of its moves
+
+    def __init__(self, name, options):
+        self.name = name
+        self.options = options
+        for setting in options:
+            if setting not in default_settings:
+                default_settings[setting] = getattr(minimax_chess, setting)
+
+        # The tables are built with this engine's settings applied, so options like tt_size_mb take effect
+        self.state = {}
+        self.activate()
+        self.state = new_engine_state()
+
+    def activate(self):
+        for setting, value in default_settings.items():
+            setattr(minimax_chess, setting, self.options.get(setting, value))
+        for name, value in self.state.items():
+            setattr(minimax_chess, name, value)
+
+    def new_game(self):
+        self.activate()
+        minimax_chess.new_game()
+
+
+def get_player(name, options):
+    if name not in players:
+        players[name] = Player(name, options)
+    return players[name]
+
+
+def init_worker(stop):
+    # Runs once in every worker process: the match event also stops the search that is running
+    global match_stop
+
+    match_stop = stop
+
+    def stop_search():
+        stop.wait()
+        minimax_chess.stop_event.set()
+
+    threading.Thread(target=stop_search, daemon=True).start()
+
+
+def play_game(job):
+    # Play one game in a worker process and return its result and statistics, or None if the match was decided first
+    game_index, opening, engines, limits = job
+    time_limit, node_limit, depth_limit = limits
+    white, black = (get_player(name, options) for name, options in engines)
+    white.new_game()
+    black.new_game()
+
+    board = chess.Board(opening)
+    nodes = {white.name: 0, black.name: 0}
+    think_time = {white.name: 0.0, black.name: 0.0}
+
+    while not board.is_game_over(claim_draw=True) and board.ply() < MAX_PLIES:
+        player = white if board.turn == chess.WHITE else black
+        player.activate()
+        minimax_chess.transposition_table.new_search()
+        minimax_chess.age_move_ordering()
+        stats = minimax_chess.new_search_stats()
+
+        start_time = time.perf_counter()
+        move, _, _ = minimax_chess.iterative_deepening(
+            board, time_limit, node_limit, depth_limit
+        )
+        if match_stop is not None and match_stop.is_set():
+            return None
+        think_time[player.name] += time.perf_counter() - start_time
+        nodes[player.name] += stats.nodes
+        board.push(move)
+
+    outcome = board.outcome(claim_draw=True)
+    result = outcome.result() if outcome is not None else "1/2-1/2"
+    termination = (
+        outcome.termination.name.lower() if outcome is not None else "max_plies"
+    )
+
+    game = chess.pgn.Game.from_board(board)
+    game.headers["Event"] = "Self-play"
+    game.headers["Round"] = str(game_index + 1)
+    game.headers["White"] = white.name
+    game.headers["Black"] = black.name
+    game.headers["Result"] = result
+    game.headers["Termination"] = termination
+
+    return {
+        "game": game_index,
+        "white": white.name,
+        "black": black.name,
+        "result": result,
+        "termination": termination,
+        "plies": board.ply(),
+        "nodes": nodes,
+        "time": think_time,
+        "nps": {
+            name: int(nodes[name] / think_time[name]) if think_time[name] > 0 else 0
+            for name in nodes
+        },
+        "pgn": str(game),
+    }
+
+
+def read_openings(path):
+    # FENs or EPDs, one per line
+    openings = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                board, _ = chess.Board.from_epd(line)
+                openings.append(board.fen())
+    return openings
+
+
+def score_stats(wins, draws, losses):
+    # Mean score per game and its variance per game
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (
+        wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score**2
+    ) / games
+    return score, variance
+
+
+def elo_from_score(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def score_from_elo(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_estimate(wins, draws, losses):
+    # (Elo difference, 95% error margin) of the first engine
+    games = wins + draws + losses
+    score, variance = score_stats(wins, draws, losses)
+    margin = 1.96 * math.sqrt(variance / games)
+    elo = elo_from_score(score)
+    return elo, (elo_from_score(score + margin) - elo_from_score(score - margin)) / 2
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    # Log likelihood ratio of H1 (elo = elo1) against H0 (elo = elo0), normal approximation of the trinomial model
+    games = wins + draws + losses
+    score, variance = score_stats(wins, draws, losses)
+    if variance == 0:
+        return 0.0
+    score0, score1 = score_from_elo(elo0), score_from_elo(elo1)
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def sprt_bounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def run_match(
+    engine1,
+    engine2,
+    openings=DEFAULT_OPENINGS,
+    games=200,
+    workers=None,
+    time_limit=None,
+    node_limit=None,
+    depth_limit=None,
+    elo0=0.0,
+    elo1=10.0,
+    alpha=0.05,
+    beta=0.05,
+    pgn_path=None,
+    stats_path=None,
+):
+    # engine1 and engine2 are (name, options) pairs, results are from engine1's point of view
+    # Worker processes keep one engine per name, so the names must differ
+    if engine1[0] == engine2[0]:
+        raise ValueError(f"both engines are named {engine1[0]}")
+    workers = workers or os.cpu_count() or 1
+    if time_limit is None and node_limit is None and depth_limit is None:
+        depth_limit = minimax_chess.max_depth
+    limits = (time_limit, node_limit, depth_limit)
+    lower, upper = sprt_bounds(alpha, beta)
+
+    def jobs():
+        # Game pairs: every opening with either engine as White
+        for game_index in range(games):
+            opening = openings[(game_index // 2) % len(openings)]
+            if game_index % 2 == 0:
+                yield game_index, opening, (engine1, engine2), limits
+            else:
+                yield game_index, opening, (engine2, engine1), limits
+
+    wins = draws = losses = 0
+    llr = 0.0
+    decision = None
+    pgn_file = open(pgn_path, "w") if pgn_path else None
+    stats_file = open(stats_path, "w") if stats_path else None
+    job_iter = jobs()
+
+    context = multiprocessing.get_context()
+    stop = context.Event()
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=init_worker,
+        initargs=(stop,),
+    )
+    try:
+        pending = set()
+        for job in job_iter:
+            pending.add(executor.submit(play_game, job))
+            if len(pending) >= workers * 2:
+                break
+
+        while pending and decision is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                game = future.result()
+                if game["result"] == "1/2-1/2":
+                    draws += 1
+                elif (game["result"] == "1-0") == (game["white"] == engine1[0]):
+                    wins += 1
+                else:
+                    losses += 1
+
+                if pgn_file is not None:
+                    pgn_file.write(game["pgn"] + "\n\n")
+                    pgn_file.flush()
+                if stats_file is not None:
+                    stats = {key: value for key, value in game.items() if key != "pgn"}
+                    stats_file.write(json.dumps(stats) + "\n")
+                    stats_file.flush()
+
+                elo, margin = elo_estimate(wins, draws, losses)
+                llr = sprt_llr(wins, draws, losses, elo0, elo1)
+                nps = ", ".join(
+                    f"{name} {value} nps" for name, value in game["nps"].items()
+                )
+                print(
+                    f"Games {wins + draws + losses}: +{wins} ={draws} -{losses}, "
+                    f"Elo {elo:.1f} +- {margin:.1f}, LLR {llr:.2f} [{lower:.2f}, {upper:.2f}] ({nps})"
+                )
+                if llr >= upper:
+                    decision = "H1"
+                elif llr <= lower:
+                    decision = "H0"
+
+            if decision is None:
+                for job in job_iter:
+                    pending.add(executor.submit(play_game, job))
+                    if len(pending) >= workers * 2:
+                        break
+
+    finally:
+        # Queued games are dropped and running games return at their current move, so the wait is short
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    if pgn_file is not None:
+        pgn_file.close()
+    if stats_file is not None:
+        stats_file.close()
+
+    elo, margin = elo_estimate(wins, draws, losses) if wins + draws + losses else (0, 0)
+    return {
+        "wins": wins,
+        "draws": draws,
+        "losses": losses,
+        "elo": elo,
+        "margin": margin,
+        "llr": llr,
+        "decision": decision,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Play two engine configurations against each other with an SPRT stopping rule"
+    )
+    parser.add_argument(
+        "--engine1",
+        default="",
+        help="settings of the new engine, e.g. 'late_move_reductions=False,LMR_REDUCTION=2'",
+    )
+    parser.add_argument("--engine2", default="", help="settings of the base engine")
+    parser.add_argument("--name1", default="new")
+    parser.add_argument("--name2", default="base")
+    parser.add_argument("--openings", help="EPD or FEN file, one opening per line")
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--time", type=float, default=None, help="seconds per move")
+    parser.add_argument("--nodes", type=int, default=None, help="nodes per move")
+    parser.add_argument("--depth", type=int, default=None, help="depth per move")
+    parser.add_argument("--elo0", type=float, default=0.0)
+    parser.add_argument("--elo1", type=float, default=10.0)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--pgn", default="selfplay.pgn")
+    parser.add_argument("--stats", default="selfplay.jsonl")
+    args = parser.parse_args()
+    if args.name1 == args.name2:
+        parser.error("--name1 and --name2 must be different")
+
+    match = run_match(
+        (args.name1, parse_options(args.engine1)),
+        (args.name2, parse_options(args.engine2)),
+        openings=read_openings(args.openings) if args.openings else DEFAULT_OPENINGS,
+        games=args.games,
+        workers=args.workers,
+        time_limit=args.time,
+        node_limit=args.nodes,
+        depth_limit=args.depth,
+        elo0=args.elo0,
+        elo1=args.elo1,
+        alpha=args.alpha,
+        beta=args.beta,
+        pgn_path=args.pgn,
+        stats_path=args.stats,
+    )
+    print(
+        f"Result: +{match['wins']} ={match['draws']} -{match['losses']}, "
+        f"Elo {match['elo']:.1f} +- {match['margin']:.1f}, "
+        f"SPRT: {match['decision'] or 'no decision'}"
+    )
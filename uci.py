@@ -0,0 +1,330 @@
+import math
+import sys
+import threading
+import time
+
+import chess
+
+import minimax_chess
+from parallel_search import ParallelSearch
+
+# UCI (Universal Chess Interface)
+# Lets GUIs and match runners drive the engine over stdin/stdout: python uci.py
+# Commands are read on the main thread while searches run on their own thread,
+# so stop and ponderhit reach a running search right away through minimax_chess.stop_event.
+
+ENGINE_NAME = "minimax_chess"
+ENGINE_AUTHOR = "RishabSA"
+
+DEFAULT_MOVES_TO_GO = 30  # Assumed moves left in the time control when not given
+MOVE_OVERHEAD = 0.05  # Seconds kept back for communication delays
+MAX_THREADS = 64
+# go options followed by a number
+GO_OPTIONS = (
+    "wtime",
+    "btime",
+    "winc",
+    "binc",
+    "movestogo",
+    "depth",
+    "nodes",
+    "mate",
+    "movetime",
+)
+
+
+def allocate_time(board, options):
+    # Seconds to spend on this move from the go options, or None for no time limit
+    if "movetime" in options:
+        return max(0.0, options["movetime"] / 1000 - MOVE_OVERHEAD)
+
+    time_key, inc_key = (
+        ("wtime", "winc") if board.turn == chess.WHITE else ("btime", "binc")
+    )
+    if time_key not in options:
+        return None
+
+    remaining = options[time_key] / 1000
+    increment = options.get(inc_key, 0) / 1000
+    moves_to_go = options.get("movestogo", DEFAULT_MOVES_TO_GO)
+
+    budget = remaining / max(1, moves_to_go) + increment * 0.75
+    # Never use more than half of what is left
+    return max(0.01, min(budget, remaining / 2 - MOVE_OVERHEAD))
+
+
+def format_score(best_eval, depth):
+    # Scores are from the side to move. A mate is found within depth plies,
+    # the exact distance is not known so the bound is reported.
+    if best_eval == math.inf:
+        return f"mate {(depth + 1) // 2}"
+    if best_eval == -math.inf:
+        return f"mate -{(depth + 1) // 2}"
+    return f"cp {int(best_eval)}"
+
+
+class UCIEngine:
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.board = chess.Board()
+        self.threads = 1
+        self.parallel = None  # ParallelSearch while Threads > 1
+
+        self.search_thread = None
+        # Set by stop or ponderhit: a ponder or infinite search may report its best move
+        self.release = threading.Event()
+        self.ponder_time_limit = None  # Seconds for the move after a ponderhit
+        self.ponder_timer = None
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def handle(self, line):
+        # Run one command, returns False on quit
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(
+                f"option name Hash type spin default {minimax_chess.tt_size_mb} min 1 max 4096"
+            )
+            self.send(
+                f"option name Threads type spin default 1 min 1 max {MAX_THREADS}"
+            )
+            self.send("option name Ponder type check default false")
+            self.send("option name SyzygyPath type string default <empty>")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.setoption(args)
+        elif command == "ucinewgame":
+            self.wait()
+            minimax_chess.new_game()
+        elif command == "position":
+            self.wait()
+            self.position(args)
+        elif command == "go":
+            self.go(args)
+        elif command == "stop":
+            self.stop()
+        elif command == "ponderhit":
+            self.ponderhit()
+        elif command == "quit":
+            self.stop()
+            self.wait()
+            return False
+        return True
+
+    def setoption(self, args):
+        # setoption name <name> [value <value>]
+        if "name" not in args:
+            return
+        if "value" in args:
+            name = " ".join(args[args.index("name") + 1 : args.index("value")])
+            value = " ".join(args[args.index("value") + 1 :])
+        else:
+            name = " ".join(args[args.index("name") + 1 :])
+            value = ""
+
+        self.wait()
+        name = name.lower()
+        if name in ("hash", "threads"):
+            # A malformed value is ignored, like an unknown option
+            try:
+                number = int(value)
+            except ValueError:
+                return
+
+        if name == "hash":
+            minimax_chess.tt_size_mb = max(1, number)
+            if self.parallel is not None:
+                self.close_parallel()
+            minimax_chess.transposition_table.resize(minimax_chess.tt_size_mb)
+        elif name == "threads":
+            threads = min(MAX_THREADS, max(1, number))
+            if threads != self.threads:
+                self.close_parallel()
+                self.threads = threads
+        elif name == "syzygypath":
+            minimax_chess.set_syzygy_path(
+                value if value and value != "<empty>" else None
+            )
+
+    def position(self, args):
+        # position [startpos | fen <fen>] [moves <move> ...]
+        if "moves" in args:
+            moves = args[args.index("moves") + 1 :]
+            args = args[: args.index("moves")]
+        else:
+            moves = []
+
+        # A malformed FEN or an illegal move leaves the previous position
+        try:
+            if args and args[0] == "fen":
+                board = chess.Board(" ".join(args[1:]))
+            else:
+                board = chess.Board()
+            for uci in moves:
+                board.push_uci(uci)
+        except ValueError:
+            return
+        self.board = board
+
+    def go(self, args):
+        self.wait()
+
+        options = {}
+        flags = set()
+        i = 0
+        while i < len(args):
+            if args[i] in ("infinite", "ponder"):
+                flags.add(args[i])
+                i += 1
+            elif args[i] in GO_OPTIONS:
+                # Options with a malformed or missing number are ignored
+                if i + 1 < len(args):
+                    try:
+                        options[args[i]] = int(args[i + 1])
+                    except ValueError:
+                        pass
+                i += 2
+            else:
+                # searchmoves is not supported: its moves, and any unknown token, are skipped
+                i += 1
+
+        time_limit = allocate_time(self.board, options)
+        node_limit = options.get("nodes")
+        depth_limit = options.get("depth")
+
+        # Infinite and ponder searches run until stop (or ponderhit), whatever they find
+        wait_for_release = bool(flags)
+        if wait_for_release:
+            self.ponder_time_limit = time_limit if "ponder" in flags else None
+            time_limit = None
+            if depth_limit is None:
+                depth_limit = minimax_chess.MAX_ITERATIVE_DEPTH
+        elif time_limit is None and node_limit is None and depth_limit is None:
+            # A bare go searches until stop as well
+            wait_for_release = True
+            depth_limit = minimax_chess.MAX_ITERATIVE_DEPTH
+
+        if self.threads > 1 and self.parallel is None:
+            self.parallel = ParallelSearch(self.threads)
+
+        self.release.clear()
+        minimax_chess.stop_event.clear()
+        self.search_thread = threading.Thread(
+            target=self.search,
+            args=(
+                self.board.copy(),
+                time_limit,
+                node_limit,
+                depth_limit,
+                wait_for_release,
+            ),
+            daemon=True,
+        )
+        self.search_thread.start()
+
+    def search(self, board, time_limit, node_limit, depth_limit, wait_for_release):
+        start_time = time.time()
+
+        def on_iteration(depth, best_move, best_eval):
+            elapsed = time.time() - start_time
+            nodes = minimax_chess.search_stats.nodes
+            pv = minimax_chess.get_principal_variation(board, best_move, depth)
+            self.send(
+                f"info depth {depth} score {format_score(best_eval, depth)} "
+                f"nodes {nodes} nps {int(nodes / max(elapsed, 1e-3))} "
+                f"hashfull {minimax_chess.transposition_table.hashfull()} "
+                f"time {int(elapsed * 1000)} pv {' '.join(move.uci() for move in pv)}"
+            )
+
+        best_move = minimax_chess.get_prepared_move(board)
+        if best_move is None:
+            if self.parallel is not None:
+                best_move, _, _, _ = self.parallel.search(
+                    board, time_limit, node_limit, depth_limit, on_iteration
+                )
+            else:
+                minimax_chess.transposition_table.new_search()
+                minimax_chess.age_move_ordering()
+                minimax_chess.new_search_stats()
+                best_move, _, _ = minimax_chess.iterative_deepening(
+                    board,
+                    time_limit,
+                    node_limit,
+                    depth_limit,
+                    info_callback=on_iteration,
+                )
+
+        # The GUI decides when a ponder or infinite search is over
+        if wait_for_release:
+            self.release.wait()
+        if self.ponder_timer is not None:
+            self.ponder_timer.cancel()
+            self.ponder_timer = None
+
+        if best_move is None:
+            self.send("bestmove 0000")
+            return
+
+        board.push(best_move)
+        ponder_move = minimax_chess.get_ponder_move(board)
+        if ponder_move is not None:
+            self.send(f"bestmove {best_move.uci()} ponder {ponder_move.uci()}")
+        else:
+            self.send(f"bestmove {best_move.uci()}")
+
+    def stop(self):
+        self.release.set()
+        minimax_chess.stop_event.set()
+
+    def ponderhit(self):
+        # The opponent played the ponder move, the running search now has the time of a normal move
+        # Without a clock in go ponder it keeps searching until stop
+        if self.search_thread is None or self.ponder_time_limit is None:
+            return
+        self.ponder_timer = threading.Timer(
+            self.ponder_time_limit, minimax_chess.stop_event.set
+        )
+        self.ponder_timer.start()
+        self.release.set()
+
+    def wait(self):
+        # Wait for the running search to report its move
+        if self.search_thread is not None:
+            self.search_thread.join()
+            self.search_thread = None
+
+    def close_parallel(self):
+        if self.parallel is not None:
+            self.parallel.close()
+            self.parallel = None
+
+    def close(self):
+        self.stop()
+        self.wait()
+        self.close_parallel()
+
+
+def main():
+    engine = UCIEngine()
+    try:
+        for line in sys.stdin:
+            if not engine.handle(line):
+                break
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()